@@ -0,0 +1,42 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from djultra import services
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def slow_queries_view(request):
+    """
+    Lists the slow statements captured by QueryLoggingMiddleware, worst
+    accumulated time first, with the latest EXPLAIN plan of each.
+    """
+    # Plans and statements carry literal values from real requests
+    if not request.user.is_superuser:
+        raise PermissionDenied
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow queries',
+        'entries': services.query_plans.store.worst(limit=100),
+        'config': services.query_plans.get_config(),
+    }
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
+
+
+def install():
+    get_urls = admin.site.get_urls
+
+    def get_urls_with_slow_queries():
+        return [
+            path('djultra/slow-queries/', admin.site.admin_view(slow_queries_view), name='djultra_slow_queries'),
+            *get_urls(),
+        ]
+
+    admin.site.get_urls = get_urls_with_slow_queries
+
+
+install()
@@ -0,0 +1,47 @@
+# djultra/benchmarks/__init__.py
+#
+# Micro-benchmarks for djultra's hot paths, run with
+#
+#     python manage.py benchmark [topic ...] [--check]
+#
+# Each topic is a module in this package with a `run(number)` function
+# yielding Results, usually seconds per call. A topic may define a BASELINE
+# result name and BUDGETS, the multiple of the baseline a result may take
+# at most; comparing against a baseline measured in the same run keeps
+# the check meaningful on any machine.
+import importlib
+import timeit
+from collections import namedtuple
+
+TOPICS = ['logging', 'fields', 'json', 'serializers']
+
+# `unit` is 's' for seconds per call, '%' for a share or 'B' for bytes
+Result = namedtuple('Result', 'name value unit', defaults=('s',))
+
+
+def measure(func, number=10000, repeat=5):
+    """Best time per call of `func` over `repeat` rounds of `number` calls."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def get_module(topic):
+    return importlib.import_module(f'{__name__}.{topic}')
+
+
+def run(topic, number=10000):
+    return list(get_module(topic).run(number))
+
+
+def check(topic, results):
+    """(name, ratio, budget) for every result of `results` over its budget."""
+    module = get_module(topic)
+    if not hasattr(module, 'BASELINE'):
+        return []
+    results = {result.name: result.value for result in results}
+    baseline = results[module.BASELINE]
+    failures = []
+    for name, budget in getattr(module, 'BUDGETS', {}).items():
+        ratio = results[name] / baseline
+        if ratio > budget:
+            failures.append((name, ratio, budget))
+    return failures
@@ -0,0 +1,177 @@
+# djultra/benchmarks/fields.py
+import random
+import re
+from datetime import date, datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.test.utils import isolate_apps
+
+import django_countries
+
+from djultra import fields
+from djultra.benchmarks import Result, measure
+
+BASELINE = 'Django DateField from_db per row'
+
+# Loading rows with djultra's DateField must cost about what Django's own
+# does; the descriptor stores database values without parsing them
+BUDGETS = {
+    'djultra DateField from_db per row': 1.5,
+}
+
+
+def amounts(count, seed=0):
+    """German formatted amounts like a spreadsheet export has them."""
+    rng = random.Random(seed)
+    values = []
+    for _ in range(count):
+        value = f'{rng.randint(0, 9_999_999):,}'.replace(',', '.')
+        if rng.random() < 0.7:
+            value += f',{rng.randint(0, 99):02d}'
+        values.append(value)
+    return values
+
+
+def run_decimal(number):
+    field = fields.DecimalField(max_digits=12, decimal_places=2)
+    values = amounts(1000)
+    rounds = max(1, number // 1000)
+
+    def one_by_one():
+        for value in values:
+            field.to_python(value)
+
+    yield Result('DecimalField.to_python per value', measure(one_by_one, rounds) / len(values))
+    yield Result('DecimalField.parse_many per value', measure(lambda: field.parse_many(values), rounds) / len(values))
+
+
+def legacy_parse_date(value):
+    """DateField.to_python() before the compiled fast path; the reference for identical results."""
+    formats = [
+        '%d %b %y', '%d %B %y', '%d %b %Y', '%d %B %Y', '%B %d %Y', '%Y-%m-%d', '%d.%m.%Y',
+        '%d/%m/%Y', '%d/%m/%y', '%y%m%d', '%Y-%m', '%y-%m', '%Y',
+    ]
+    value = re.sub(r'(\b19\b|\b20\b) (\d{2})$', r'\1\2', value)
+    pattern = r' (?P<local_month>[A-ZÇĞİÖŞÜ]{3})/(?P<english_month>[A-ZÇĞİÖŞÜ]{3}) '
+    value = re.sub(pattern, r' \2 ', value, flags=re.UNICODE)
+    value = re.sub(r'[^\w\s./-]|\.$', ' ', value).upper()
+    value = re.sub(r'\s\s+', ' ', value).strip()
+    value = re.sub(r'\b(\d+)(?:ST|ND|RD|TH)\b', r'\1', value)
+    months = {'FÉV': 'FEB', 'AVR': 'APR', 'MAI': 'MAY', 'JUI': 'JUN', 'AOÛ': 'AUG', 'DÉC': 'DEC'}
+    for key, value_month in months.items():
+        value = value.replace(key, value_month)
+    value = re.sub(r'\b(\w+)\b/\b\1\b', r'\1', value)
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValidationError(f"Date format for '{value}' not recognized")
+
+
+DATE_TEMPLATES = [
+    '{d} {b} {y2}', '{d} {b_fr} {y2}', '{d} {B} {Y}', '{d}th of {B} {Y}', '{B} {d}, {Y}', '{B} {d} {Y}',
+    '{Y}-{m:02d}-{d:02d}', '{d:02d}.{m:02d}.{Y}', '{d}/{m}/{Y}', '{d:02d}/{m:02d}/{y2}', '{y2}{m:02d}{d:02d}',
+    '{Y}-{m:02d}', '{y2}-{m:02d}', '{Y}', '{d} {b_es}/{b} {Y}', '{d} OF {B} {Y_split}', ' "{d:02d}.{m:02d}.{Y}." ',
+    '{b}/{b} {Y}', '{d:02d}.{m:02d}.{y2}', '{m:02d}/{d:02d}/{Y}', 'n/a', '', '{d}-{b}-{Y}',
+]
+FRENCH_MONTHS = ['JAN', 'FÉV', 'MAR', 'AVR', 'MAI', 'JUI', 'JUL', 'AOÛ', 'SEP', 'OCT', 'NOV', 'DÉC']
+SPANISH_MONTHS = ['ENE', 'FEB', 'MAR', 'ABR', 'MAY', 'JUN', 'JUL', 'AGO', 'SEP', 'OCT', 'NOV', 'DIC']
+
+
+def messy_dates(count, seed=0, distinct=500):
+    """Date strings in the shapes imports bring, `distinct` different ones repeated."""
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(distinct):
+        day = date(1990, 1, 1) + timedelta(days=rng.randint(0, 15000))
+        pool.append(rng.choice(DATE_TEMPLATES).format(
+            d=day.day, m=day.month, Y=day.year, y2=f'{day.year % 100:02d}', Y_split=f'{day.year // 100} {day.year % 100:02d}',
+            b=day.strftime('%b').upper(), B=day.strftime('%B'), b_fr=FRENCH_MONTHS[day.month - 1],
+            b_es=SPANISH_MONTHS[day.month - 1],
+        ))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def run_country(number):
+    field = fields.CountryField()
+    values = ['DE', 'Germany', 'deu', '276', 'Deutschland', 'U.S.A.', 'Türkiye', 'Narnia'] * 125
+    rounds = max(1, number // 1000)
+
+    def alpha2():
+        for value in values:
+            django_countries.countries.alpha2(value.strip().upper())
+
+    fields.country_index()
+    yield Result('django-countries alpha2 per value', measure(alpha2, rounds) / len(values))
+    yield Result('CountryField.normalize_many per value', measure(lambda: field.normalize_many(values), rounds) / len(values))
+
+
+def run_date(number):
+    field = fields.DateField()
+    values = messy_dates(1000)
+    rounds = max(1, number // 1000)
+
+    def legacy():
+        for value in values:
+            try:
+                legacy_parse_date(value)
+            except ValidationError:
+                pass
+
+    def compiled():
+        # The compiled normalization and format filter without the memo
+        for value in values:
+            fields.parse_date_string.__wrapped__(value)
+
+    yield Result('DateField legacy per value', measure(legacy, rounds) / len(values))
+    yield Result('DateField compiled, no memo, per value', measure(compiled, rounds) / len(values))
+    yield Result('DateField.parse_many per value', measure(lambda: field.parse_many(values), rounds) / len(values))
+
+
+class ParsingCleanValueDescriptor(fields.CleanValueDescriptor):
+    """The descriptor before the fast path: to_python() on every assignment."""
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = self.field.to_python(value)
+
+
+class ParsingDateField(fields.DateField):
+    descriptor_class = ParsingCleanValueDescriptor
+
+
+def run_from_db(number):
+    # Model.from_db() is what every queryset row goes through; no table needed
+    with isolate_apps('djultra'):
+        class DjangoRow(models.Model):
+            started = models.DateField(null=True)
+            ended = models.DateField(null=True)
+
+        class DjultraRow(models.Model):
+            started = fields.DateField()
+            ended = fields.DateField()
+
+        class ParsingRow(models.Model):
+            started = ParsingDateField()
+            ended = ParsingDateField()
+
+    # 100k rows with the default --number
+    count = number * 10
+    field_names = ['id', 'started', 'ended']
+    rows = [(i, date(2020, 1, 1) + timedelta(days=i % 1000), None if i % 3 else date(2024, 1, 1)) for i in range(count)]
+
+    def load(model):
+        from_db = model.from_db
+        return lambda: [from_db('default', field_names, row) for row in rows]
+
+    yield Result('Django DateField from_db per row', measure(load(DjangoRow), 1, repeat=3) / count)
+    yield Result('djultra DateField from_db per row', measure(load(DjultraRow), 1, repeat=3) / count)
+    yield Result('DateField parsing on assignment, per row', measure(load(ParsingRow), 1, repeat=3) / count)
+
+
+def run(number=10000):
+    yield from run_decimal(number)
+    yield from run_country(number)
+    yield from run_date(number)
+    yield from run_from_db(number)
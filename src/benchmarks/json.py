@@ -0,0 +1,124 @@
+# djultra/benchmarks/json.py
+import json
+import random
+import tracemalloc
+
+from django.db import models
+from django.test.utils import isolate_apps
+
+from djultra import fields
+from djultra.benchmarks import Result, measure
+
+BASELINE = 'Django JSONField per row'
+
+# A lazy JSONField whose rows are never read must cost what Django's does
+BUDGETS = {
+    'djultra JSONField lazy, untouched, per row': 1.3,
+}
+
+
+def document(rng):
+    """A settings-like JSON document of about 2 kB, a few levels deep."""
+    return {
+        'id': rng.randint(1, 10**9),
+        'settings': {
+            'theme': rng.choice(['dark', 'light']),
+            'layout': {'columns': rng.randint(1, 4), 'widgets': [{'name': f'widget{i}', 'size': [i, i * 2]} for i in range(6)]},
+            'notifications': {channel: {'enabled': rng.random() < 0.5, 'hours': list(range(8, 18))}
+                              for channel in ('email', 'sms', 'push')},
+        },
+        'history': [{'at': f'2024-01-{day:02d}', 'action': 'login', 'meta': {'ip': '10.0.0.1', 'agent': 'Mozilla/5.0'}}
+                    for day in range(1, 11)],
+    }
+
+
+def legacy_from_db_value(value, expression, connection):
+    """JSONField.from_db_value() before decode-once and lazy mode."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return fields.DotDict(value) if isinstance(value, dict) else value
+
+
+def deep_document(depth=6, width=4):
+    """A tree `depth` levels deep with `width` children, lists and scalars per level."""
+    if depth == 0:
+        return {'value': 1, 'label': 'leaf'}
+    return {
+        'children': {f'child{i}': deep_document(depth - 1, width) for i in range(width)},
+        'entries': [{'index': i} for i in range(width)],
+        'name': f'level{depth}',
+    }
+
+
+def allocated(func):
+    """Bytes still allocated by what func() returns."""
+    tracemalloc.start()
+    try:
+        result = func()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def run_views(number):
+    data = deep_document()
+    rounds = max(1, number // 1000)
+
+    def read(wrapped):
+        return wrapped.children.child0.children.child1.entries[2]['index']
+
+    yield Result('DotDict wrap deep document', measure(lambda: fields.DotDict(data), rounds))
+    yield Result('DotView wrap deep document', measure(lambda: fields.DotView(data), number))
+    yield Result('DotDict wrap and read one path', measure(lambda: read(fields.DotDict(data)), rounds))
+    yield Result('DotView wrap and read one path', measure(lambda: read(fields.DotView(data)), number))
+    dot_dict, dot_view = fields.DotDict(data), fields.DotView(data)
+    yield Result('DotDict read one path again', measure(lambda: read(dot_dict), number))
+    yield Result('DotView read one path again', measure(lambda: read(dot_view), number))
+    yield Result('DotDict memory', allocated(lambda: fields.DotDict(data)), 'B')
+    yield Result('DotView memory, one path read', allocated(lambda: (view := fields.DotView(data), read(view))), 'B')
+
+
+def run_rows(number):
+    with isolate_apps('djultra'):
+        class DjangoRow(models.Model):
+            data = models.JSONField()
+
+        class DjultraRow(models.Model):
+            data = fields.JSONField()
+
+        class LazyRow(models.Model):
+            data = fields.JSONField(lazy=True)
+
+    # 100k rows with the default --number; what a queryset does per row:
+    # run the field's converter, then Model.from_db()
+    count = number * 10
+    rng = random.Random(0)
+    blobs = [json.dumps(document(rng)) for _ in range(100)]
+    rows = [(i, blobs[i % len(blobs)]) for i in range(count)]
+    field_names = ['id', 'data']
+
+    def load(model, convert=None, read=False):
+        convert = convert or model._meta.get_field('data').from_db_value
+        from_db = model.from_db
+
+        def load_rows():
+            for pk, raw in rows:
+                obj = from_db('default', field_names, (pk, convert(raw, None, None)))
+                if read:
+                    obj.data.settings
+        return load_rows
+
+    yield Result('Django JSONField per row', measure(load(DjangoRow), 1, repeat=1) / count)
+    yield Result('djultra JSONField before, per row', measure(load(DjultraRow, legacy_from_db_value), 1, repeat=1) / count)
+    yield Result('djultra JSONField per row', measure(load(DjultraRow), 1, repeat=1) / count)
+    yield Result('djultra JSONField lazy, untouched, per row', measure(load(LazyRow), 1, repeat=1) / count)
+    yield Result('djultra JSONField lazy, one key read, per row', measure(load(LazyRow, read=True), 1, repeat=1) / count)
+
+
+def run(number=10000):
+    yield from run_rows(number)
+    yield from run_views(number)
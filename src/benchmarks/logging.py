@@ -0,0 +1,167 @@
+# djultra/benchmarks/logging.py
+import logging
+import os
+import sys
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, override_settings
+from django.utils.module_loading import import_string
+
+from djultra import logging as djultra_logging
+from djultra.benchmarks import Result, measure
+from djultra.logging import pretty
+from djultra.middleware import RequestIDMiddleware
+
+BASELINE = 'plain StreamHandler'
+
+# Multiples of the plain StreamHandler per record; `benchmark --check`
+# fails beyond these. CustomRichHandler measures about 160-240x and
+# varies a lot between runs, hence the headroom.
+BUDGETS = {
+    'StructuredHandler json': 8,
+    'CustomRichHandler': 400,
+    'QueuedHandler enqueue': 4,
+}
+
+
+class FormattingHandler(logging.Handler):
+    """Formats every record like a real handler, but writes nowhere."""
+
+    def emit(self, record):
+        self.format(record)
+
+
+def make_logger(level, handler_level=logging.INFO, filters=()):
+    # Detached from the logger tree, so nothing reaches the project's handlers
+    logger = logging.Logger('djultra.benchmarks.sample', level)
+    handler = FormattingHandler(handler_level)
+    for record_filter in filters:
+        handler.addFilter(record_filter)
+    logger.addHandler(handler)
+    return logger
+
+
+def make_record(exc_info=None):
+    return logging.getLogRecordFactory()(
+        'djultra.benchmarks.sample', logging.ERROR if exc_info else logging.INFO, __file__, 1,
+        'Processed order id=%s items=%s', (42, 3), exc_info)
+
+
+def make_exc_info():
+    try:
+        {}['missing']
+    except KeyError:
+        return sys.exc_info()
+
+
+def handle_uncached(handler, record):
+    # Formatter.format() caches the formatted traceback on the record
+    record.exc_text = None
+    handler.handle(record)
+
+
+def run_formatting(number):
+    post = QueryDict('&'.join(f'field_{i}=value_{i}' for i in range(20)))
+    data = post.dict()
+
+    # DEBUG disabled in the handler only (the former root level) versus in
+    # the logger as well, versus a call site guarded by isEnabledFor()
+    handler_only = make_logger(logging.DEBUG)
+    logger_level = make_logger(logging.INFO)
+
+    def guarded():
+        if logger_level.isEnabledFor(logging.DEBUG):
+            logger_level.debug('POST data: ', post.dict())
+
+    yield Result('debug off in handler, payload built', measure(lambda: handler_only.debug('POST data: ', post.dict()), number))
+    yield Result('debug off in logger, payload built', measure(lambda: logger_level.debug('POST data: ', post.dict()), number))
+    yield Result('debug off in logger, guarded call', measure(guarded, number))
+
+    # Records a filter rejects: formatted at the call site versus
+    # print-style arguments, which are formatted only when emitted
+    filtered = make_logger(logging.INFO, filters=[lambda record: False])
+    yield Result('filtered, formatted at call site', measure(lambda: filtered.info(f'POST data: {pretty(data)}'), number))
+    yield Result('filtered, print-style (lazy)', measure(lambda: filtered.info('POST data: ', data), number))
+
+    emitted = make_logger(logging.INFO)
+    yield Result('emitted, print-style', measure(lambda: emitted.info('POST data: ', data), number))
+
+
+def run_handlers(number, devnull):
+    rich = djultra_logging.CustomRichHandler(rich_tracebacks=True)
+    rich.console.file = devnull
+    handlers = {
+        BASELINE: logging.StreamHandler(devnull),
+        'StructuredHandler json': djultra_logging.StructuredHandler(devnull),
+        'CustomRichHandler': rich,
+    }
+    record = make_record()
+    exc_record = make_record(make_exc_info())
+    # Tracebacks cost milliseconds with Rich; fewer calls suffice
+    exc_number = max(1, number // 100)
+
+    for name, handler in handlers.items():
+        yield Result(name, measure(lambda: handler.handle(record), number))
+    for name, handler in handlers.items():
+        yield Result(f'{name}, traceback', measure(lambda: handle_uncached(handler, exc_record), exc_number))
+
+    # What the request thread pays with LOG_QUEUE; the queue is unbounded
+    # here so the measurement never hits the overflow policy
+    queued = djultra_logging.QueuedHandler(djultra_logging.StructuredHandler(devnull), maxsize=0)
+    try:
+        yield Result('QueuedHandler enqueue', measure(lambda: queued.handle(record), number))
+    finally:
+        queued.close()
+
+
+def build_middleware_stack(view):
+    handler = view
+    for path in reversed(settings.MIDDLEWARE):
+        try:
+            handler = import_string(path)(handler)
+        except MiddlewareNotUsed:
+            pass
+    return handler
+
+
+def run_middleware(number, devnull):
+    """Time per request through settings.MIDDLEWARE with and without logging."""
+    stack = build_middleware_stack(lambda request: HttpResponse('ok'))
+    factory = RequestFactory()
+
+    def request():
+        stack(factory.get('/benchmark/', HTTP_X_REQUEST_ID='benchmark', HTTP_X_START_TIME=datetime.now()))
+
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    handler = djultra_logging.CustomRichHandler()
+    handler.console.file = devnull
+    root.handlers = [handler]
+    root.setLevel(logging.DEBUG)
+    # RequestFactory requests come from 'testserver', which the project's
+    # ALLOWED_HOSTS need not include
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with_logging = measure(request, max(1, number // 10))
+            logging.disable(logging.CRITICAL)
+            without_logging = measure(request, max(1, number // 10))
+    finally:
+        logging.disable(logging.NOTSET)
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        # Otherwise request_id='benchmark' sticks to later records of this thread
+        RequestIDMiddleware._thread_locals.__dict__.clear()
+
+    yield Result('middleware stack, DEBUG to CustomRichHandler', with_logging)
+    yield Result('middleware stack, logging disabled', without_logging)
+    yield Result('middleware stack, logging share', max(0, with_logging - without_logging) / with_logging, '%')
+
+
+def run(number=10000):
+    yield from run_formatting(number)
+    with open(os.devnull, 'w') as devnull:
+        yield from run_handlers(number, devnull)
+        yield from run_middleware(number, devnull)
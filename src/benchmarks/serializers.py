@@ -0,0 +1,29 @@
+# djultra/benchmarks/serializers.py
+from django.contrib.auth.models import Group, User
+
+from djultra import serializers
+from djultra.benchmarks import Result, measure
+
+
+def build_serializer():
+    """What a list endpoint does before the first row: build the serializer and its fields."""
+    serializer = serializers.DynamicFieldsModelSerializer(
+        [], many=True, model=User, fields=['id', 'username'], dynamic=['get_full_name'],
+        relations={'groups': {'model': Group, 'fields': ['name']}},
+    )
+    serializer.child.late_init()
+    serializer.child.fields['groups'].child.late_init()
+    return serializer
+
+
+def build_uncached():
+    serializers.DynamicFieldsModelSerializer._field_plans.clear()
+    serializers.create_custom_subclass.cache_clear()
+    return build_serializer()
+
+
+def run(number=10000):
+    rounds = max(1, number // 100)
+    yield Result('DynamicFieldsModelSerializer, no plan cache', measure(build_uncached, rounds))
+    build_serializer()
+    yield Result('DynamicFieldsModelSerializer, cached plan', measure(build_serializer, rounds))
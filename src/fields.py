@@ -1,19 +1,164 @@
+import gettext
 import json
 import logging
+import multiprocessing
+import os
 import re
+import sys
+import unicodedata
+from collections import Counter, UserDict, UserList, namedtuple
+from collections.abc import Mapping
 from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models
+from django.db.models.query_utils import DeferredAttribute
+from django.utils import translation
 
 import django_countries
 import django_countries.fields
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from djultra import serializers
 
 logger = logging.getLogger(__name__)
 
+# Amounts with thousands groups and at most two decimals: "1.234.567,89"
+# (German) and "1,234,567.89" (English)
+_GERMAN_NUMBER_PATTERN = re.compile(r'^[+-]?\d{1,3}(\.\d{3})*(,\d{1,2})?$')
+_ENGLISH_NUMBER_PATTERN = re.compile(r'^[+-]?\d{1,3}(,\d{3})*(\.\d{1,2})?$')
+
+# Any number in a known locale, grouped or not, with any number of
+# decimals; "1.234" matches both and so says nothing about the locale
+_LOCALE_NUMBER_PATTERNS = {
+    'de': re.compile(r'[+-]?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?'),
+    'en': re.compile(r'[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?'),
+}
+
+# A whole column in one locale, one value or empty per line, and the lines
+# of such a column that are not; see DecimalField.parse_many(). Possessive
+# quantifiers (Python 3.11) keep the match from backtracking into earlier
+# lines; without them, columns are parsed value by value.
+_POSSESSIVE_NUMBER_PATTERNS = {
+    'de': r'[+-]?+(?:\d{1,3}+(?:\.\d{3})++|\d++)(?:,\d++)?+',
+    'en': r'[+-]?+(?:\d{1,3}+(?:,\d{3})++|\d++)(?:\.\d++)?+',
+}
+_LOCALE_COLUMN_PATTERNS = {
+    locale: re.compile(rf'(?:{pattern})?+(?:\n(?:{pattern})?+)*+')
+    for locale, pattern in _POSSESSIVE_NUMBER_PATTERNS.items()
+} if sys.version_info >= (3, 11) else {}
+_LOCALE_OTHER_LINE_PATTERNS = {
+    locale: re.compile(rf'^(?!(?:{pattern.pattern})?$)', re.MULTILINE)
+    for locale, pattern in _LOCALE_NUMBER_PATTERNS.items()
+}
+_LOCALE_TRANSLATIONS = {
+    'de': str.maketrans({'.': None, ',': '.'}),
+    'en': str.maketrans({',': None}),
+}
+
+
+# Country names as imports spell them, in addition to the names, old names
+# and translations django-countries knows
+COUNTRY_ALIASES = {
+    'AMERICA': 'US', 'UNITED STATES': 'US', 'USA': 'US', 'UK': 'GB', 'GREAT BRITAIN': 'GB', 'BRITAIN': 'GB',
+    'ENGLAND': 'GB', 'SCOTLAND': 'GB', 'WALES': 'GB', 'NORTHERN IRELAND': 'GB', 'HOLLAND': 'NL', 'UAE': 'AE',
+    'EMIRATES': 'AE', 'KSA': 'SA', 'IVORY COAST': 'CI', 'BURMA': 'MM', 'CAPE VERDE': 'CV', 'EAST TIMOR': 'TL',
+    'KOREA': 'KR', 'REPUBLIC OF KOREA': 'KR', 'DPRK': 'KP', 'PRC': 'CN', 'DRC': 'CD', 'DR CONGO': 'CD',
+    'CONGO BRAZZAVILLE': 'CG', 'CONGO KINSHASA': 'CD', 'VATICAN': 'VA', 'HOLY SEE': 'VA',
+}
+
+_COUNTRY_DROP_PATTERN = re.compile(r"[.'’`´]")
+_COUNTRY_SPACE_PATTERN = re.compile(r'[\W_]+')
+_COUNTRY_SAINT_PATTERN = re.compile(r'\bSAINT\b')
+
+
+def fold_country(value):
+    """
+    Index key of a country value: accents, punctuation and a leading "the"
+    removed, "Saint" shortened, so "U.S.A." is "USA" and "Côte d'Ivoire"
+    is "COTE DIVOIRE".
+    """
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(char for char in value if not unicodedata.combining(char)).upper()
+    value = _COUNTRY_DROP_PATTERN.sub('', value)
+    value = _COUNTRY_SPACE_PATTERN.sub(' ', value).strip()
+    value = _COUNTRY_SAINT_PATTERN.sub('ST', value)
+    return value[4:] if value.startswith('THE ') else value
+
+
+def get_country_catalogs():
+    """django-countries' own translations, independent of INSTALLED_APPS and the active language."""
+    localedir = os.path.join(os.path.dirname(django_countries.__file__), 'locale')
+    languages = getattr(settings, 'COUNTRY_INDEX_LANGUAGES', None)
+    if languages is None:
+        languages = sorted(os.listdir(localedir))
+    return [gettext.translation('django', localedir, languages=[language], fallback=True) for language in languages]
+
+
+@lru_cache(maxsize=None)
+def country_index():
+    """
+    Folded key -> (alpha2 code, source), built once per process. Earlier
+    sources win: codes over names over aliases; a translation that names
+    two different countries in different languages is left out.
+    """
+    index = {}
+
+    def add(key, code, source):
+        key = fold_country(key)
+        if key:
+            index.setdefault(key, (code, source))
+
+    # Without a language, names are django-countries' English msgids
+    with translation.override(None):
+        names = {code: str(name) for code, name in django_countries.countries}
+
+    for code in names:
+        add(code, code, 'code')
+    for code in names:
+        add(django_countries.countries.alpha3(code), code, 'alpha3')
+        numeric = django_countries.countries.numeric(code)
+        if numeric is not None:
+            add(f'{numeric:03d}', code, 'numeric')
+    for code in names:
+        add(django_countries.countries.ioc_code(code), code, 'ioc')
+    for code, name in names.items():
+        add(name, code, 'name')
+    for code, old_names in django_countries.countries.OLD_NAMES.items():
+        for name in old_names:
+            if code in names:
+                add(name, code, 'alias')
+    for alias, code in COUNTRY_ALIASES.items():
+        if code in names:
+            add(alias, code, 'alias')
+
+    localized = {}
+    for catalog in get_country_catalogs():
+        for code, name in names.items():
+            key = fold_country(catalog.gettext(name))
+            if localized.setdefault(key, code) != code:
+                localized[key] = None
+    for key, code in localized.items():
+        if code is not None:
+            add(key, code, 'localized')
+    return index
+
+
+@lru_cache(maxsize=4096)
+def resolve_country(value):
+    """(alpha2 code, source) for a country code, name or alias, or (None, 'unknown')."""
+    key = fold_country(value)
+    if key.isdigit():
+        key = key.zfill(3)
+    return country_index().get(key, (None, 'unknown'))
+
 
 class CountryField(django_countries.fields.CountryField):
     def __init__(self, *args, mapping=None, form_blank=None, db_null=None, **kwargs):
@@ -28,13 +173,41 @@ class CountryField(django_countries.fields.CountryField):
     def clean(self, value, model_instance):
         if isinstance(value, str):
             value = self.mapping.get(value.strip().upper(), value.strip().upper())
-            try:
-                value = django_countries.countries.alpha2(value)
-            except KeyError:
-                pass
+            # Unknown values stay as they are for validation to reject
+            if value:
+                value = resolve_country(value)[0] or value
 
         return super().clean(value, model_instance)
 
+    def normalize_many(self, values):
+        """
+        (code, source) for each of `values`: source is 'mapping' for the
+        field's own mapping, one of country_index()'s sources, 'unknown'
+        with code None, or None for empty values.
+        """
+        results = []
+        mapping = self.mapping
+        for value in values:
+            key = str(value).strip().upper() if value is not None else ''
+            if not key:
+                results.append((None, None))
+            elif key in mapping:
+                code = resolve_country(mapping[key])[0]
+                results.append((code, 'mapping') if code else (None, 'unknown'))
+            else:
+                results.append(resolve_country(key))
+        return results
+
+    def parse_many(self, values):
+        """normalize_many() as (parsed, errors) like DecimalField.parse_many()."""
+        parsed = []
+        errors = []
+        for index, (value, (code, source)) in enumerate(zip(values, self.normalize_many(values))):
+            parsed.append(code)
+            if source == 'unknown':
+                errors.append((index, value, f"Unknown country: {value}"))
+        return parsed, errors
+
 
 class DecimalField(models.DecimalField):
     def __init__(self, *args, form_blank=None, db_null=None, **kwargs):
@@ -52,6 +225,8 @@ class DecimalField(models.DecimalField):
     #         return format(Decimal(val), 'f').rstrip('0').rstrip('.')
     #     return val
 
+    STRIP_CHARS = '.,\'"“” '
+
     def to_python(self, value):
         # Handle the case where value is already a Decimal
         if isinstance(value, Decimal):
@@ -60,20 +235,16 @@ class DecimalField(models.DecimalField):
         # Handle the German and English number format
         if isinstance(value, str):
             #logger.debug('Parsing number from string')
-            # Regex patterns
-            value = value.strip('.,\'"“” ')
+            value = value.strip(self.STRIP_CHARS)
 
-            german_format_pattern = re.compile(r'^\d{1,3}(\.\d{3})*(,\d{1,2})?$')
-            english_format_pattern = re.compile(r'^\d{1,3}(,\d{3})*(\.\d{1,2})?$')
-
-            if german_format_pattern.match(value):
+            if _GERMAN_NUMBER_PATTERN.match(value):
                 #logger.debug('German format detected')
                 try:
                     value = value.replace('.', '').replace(',', '.')
                     return Decimal(value)
                 except InvalidOperation:
                     raise ValidationError(f"Invalid decimal value: {value}")
-            elif english_format_pattern.match(value):
+            elif _ENGLISH_NUMBER_PATTERN.match(value):
                 try:
                     value = value.replace(',', '')
                     return Decimal(value)
@@ -83,8 +254,197 @@ class DecimalField(models.DecimalField):
         # Call the superclass method to ensure proper handling
         return super().to_python(value)
 
+    def detect_locale(self, values, sample=100):
+        """
+        'de' or 'en', whichever most of the strings in `values` that can
+        only be read one way are written in (looking at up to `sample` of
+        them); None if none can.
+        """
+        german = _LOCALE_NUMBER_PATTERNS['de'].fullmatch
+        english = _LOCALE_NUMBER_PATTERNS['en'].fullmatch
+        votes = Counter()
+        telling = 0
+        for value in values:
+            if telling >= sample:
+                break
+            if not isinstance(value, str) or ('.' not in value and ',' not in value):
+                continue
+            value = value.strip(self.STRIP_CHARS)
+            is_german = german(value) is not None
+            if is_german != (english(value) is not None):
+                votes['de' if is_german else 'en'] += 1
+                telling += 1
+        return votes.most_common(1)[0][0] if votes else None
+
+    def parse_number(self, value, locale=None):
+        """to_python() for one cell of a column in `locale`; empty cells are None."""
+        if value is None or isinstance(value, Decimal):
+            return value
+        if isinstance(value, str):
+            value = value.strip(self.STRIP_CHARS)
+            if not value:
+                return None
+            if locale is not None and _LOCALE_NUMBER_PATTERNS[locale].fullmatch(value):
+                return Decimal(value.translate(_LOCALE_TRANSLATIONS[locale]))
+        return self.to_python(value)
+
+    def parse_many(self, values, locale=None):
+        """
+        Parses a whole column. The locale is decided once for the column
+        (see detect_locale()) unless given, so "1.234" reads the same in every
+        row; without any telling value, each value is parsed like to_python()
+        does. Returns (parsed, errors): parsed has one value per row, None for
+        empty and invalid cells; errors lists (row index, raw value, message).
+        """
+        values = list(values)
+        locale = locale or self.detect_locale(values)
+        column_pattern = _LOCALE_COLUMN_PATTERNS.get(locale)
+        if column_pattern is not None and all(value.__class__ is str for value in values):
+            # A text column: one regex match, translate and split for all
+            # values instead of one each; only the lines that are no number
+            # in the column's locale are parsed one by one
+            column = '\n'.join([value.strip(self.STRIP_CHARS) for value in values])
+            if column.count('\n') == len(values) - 1:
+                others = []
+                if not column_pattern.fullmatch(column):
+                    line = position = 0
+                    for match in _LOCALE_OTHER_LINE_PATTERNS[locale].finditer(column):
+                        line += column.count('\n', position, match.start())
+                        position = match.start()
+                        others.append(line)
+                lines = column.translate(_LOCALE_TRANSLATIONS[locale]).split('\n')
+                for index in others:
+                    lines[index] = ''
+                parsed = [Decimal(line) if line else None for line in lines]
+                errors = []
+                for index in others:
+                    try:
+                        parsed[index] = self.parse_number(values[index], locale)
+                    except ValidationError as e:
+                        errors.append((index, values[index], e.messages[0]))
+                return parsed, errors
+
+        parsed = []
+        errors = []
+        for index, value in enumerate(values):
+            try:
+                parsed.append(self.parse_number(value, locale))
+            except ValidationError as e:
+                parsed.append(None)
+                errors.append((index, value, e.messages[0]))
+        return parsed, errors
+
 AdvancedDecimalField = DecimalField
 
+# Tried in order, the first one that parses wins
+DATE_FORMATS = [
+    '%d %b %y',     # "14 FEB 24" or "14 FÉV 24"
+    '%d %B %y',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%B %d %Y',     # "JULY 6 1997"
+    '%Y-%m-%d',     # "2018-10-25"
+    '%d.%m.%Y',     # "25.10.2019"
+    '%d/%m/%Y',
+    '%d/%m/%y',
+    '%y%m%d',
+    '%Y-%m',
+    '%y-%m',
+    '%Y',           # "2018"
+]
+
+# Normalization steps of parse_date_string(), in order
+_SPLIT_YEAR_PATTERN = re.compile(r'(\b19\b|\b20\b) (\d{2})$')
+_DOUBLE_MONTH_PATTERN = re.compile(r' (?P<local_month>[A-ZÇĞİÖŞÜ]{3})/(?P<english_month>[A-ZÇĞİÖŞÜ]{3}) ', re.UNICODE)
+_SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s./-]|\.$')
+_WHITESPACE_PATTERN = re.compile(r'\s\s+')
+_DAY_SUFFIX_PATTERN = re.compile(r'\b(\d+)(?:ST|ND|RD|TH)\b')
+_REPEATED_MONTH_PATTERN = re.compile(r'\b(\w+)\b/\b\1\b')
+
+_LOCAL_MONTHS = {
+    'FÉV': 'FEB',
+    'AVR': 'APR',
+    'MAI': 'MAY',
+    'JUI': 'JUN',
+    'AOÛ': 'AUG',
+    'DÉC': 'DEC',
+}
+_LOCAL_MONTHS_PATTERN = re.compile('|'.join(_LOCAL_MONTHS))
+
+# Digits a strptime directive consumes
+_DIRECTIVE_DIGITS = {'%d': (1, 2), '%m': (1, 2), '%y': (2, 2), '%Y': (4, 4), '%b': (0, 0), '%B': (0, 0)}
+_DIRECTIVE_PATTERN = re.compile('|'.join(_DIRECTIVE_DIGITS))
+
+
+def date_shape(value):
+    """
+    What a date string and a format have to agree on for strptime() to
+    possibly match: letters (month names), the count of each literal
+    separator and the whitespace.
+    """
+    letters = any(c.isalpha() for c in value)
+    return letters, value.count('-'), value.count('.'), value.count('/'), sum(c.isspace() for c in value)
+
+
+@lru_cache(maxsize=None)
+def candidate_date_formats(shape, digits):
+    """DATE_FORMATS that can match a value of `shape` with `digits` digits, in order."""
+    letters, dashes, dots, slashes, spaces = shape
+    candidates = []
+    for fmt in DATE_FORMATS:
+        directives = _DIRECTIVE_PATTERN.findall(fmt)
+        format_letters = '%b' in directives or '%B' in directives
+        literal = _DIRECTIVE_PATTERN.sub('', fmt)
+        if (format_letters, literal.count('-'), literal.count('.'), literal.count('/')) != (letters, dashes, dots, slashes):
+            continue
+        # A space in a format matches one or more; %d also accepts " 5"
+        if spaces < literal.count(' '):
+            continue
+        low = sum(_DIRECTIVE_DIGITS[directive][0] for directive in directives)
+        high = sum(_DIRECTIVE_DIGITS[directive][1] for directive in directives)
+        if low <= digits <= high:
+            candidates.append(fmt)
+    return tuple(candidates)
+
+
+def normalize_date_string(value):
+    # Special handling for the '16 OF DECEMBER 20 19' format
+    value = _SPLIT_YEAR_PATTERN.sub(r'\1\2', value)
+
+    # Special handling for month in '18 ABR/APR 2027' format
+    value = _DOUBLE_MONTH_PATTERN.sub(r' \2 ', value)
+
+    # Convert value to uppercase and remove special characters except slashes and dashes
+    value = _SPECIAL_CHARS_PATTERN.sub(' ', value).upper()
+    value = _WHITESPACE_PATTERN.sub(' ', value).strip()
+
+    # Remove suffixes from day values like '1ST' and '2ND', etc.
+    value = _DAY_SUFFIX_PATTERN.sub(r'\1', value)
+
+    value = _LOCAL_MONTHS_PATTERN.sub(lambda match: _LOCAL_MONTHS[match.group()], value)
+
+    # Replace the duplicate month abbreviations
+    return _REPEATED_MONTH_PATTERN.sub(r'\1', value)
+
+
+@lru_cache(maxsize=4096)
+def parse_date_string(value):
+    """
+    (date or None, normalized string) for a raw date string. Only the
+    DATE_FORMATS that fit the value's shape are tried, in their order, so
+    the result is the same as trying all of them. Memoized, as imports
+    repeat the same dates a lot.
+    """
+    normalized = normalize_date_string(value)
+    digits = sum(c.isdecimal() for c in normalized)
+    for fmt in candidate_date_formats(date_shape(normalized), digits):
+        try:
+            return datetime.strptime(normalized, fmt).date(), normalized
+        except ValueError:
+            continue
+    return None, normalized
+
+
 class TextField(models.TextField):
     pass
 
@@ -168,19 +528,29 @@ class CharField(models.CharField):
             value = self.remove_quotes_and_parentheses(value)
         return super().clean(value, model_instance)
 
+    def parse_many(self, values):
+        """The parsing half of clean() for a whole column, as (parsed, errors)."""
+        parsed = []
+        for value in values:
+            if isinstance(value, str):
+                value = self.remove_quotes_and_parentheses(value)
+            parsed.append(self.to_python(value))
+        return parsed, []
 
-class CleanValueDescriptor:
-    def __init__(self, field):
-        self.field = field
 
-    def __get__(self, instance, owner=None):
-        if instance is None:
-            return self
-        return instance.__dict__.get(self.field.name)
+class CleanValueDescriptor(DeferredAttribute):
+    """
+    Cleans values through the field's to_python() on assignment. Values of
+    the right type, which includes every value Model.from_db() assigns, are
+    stored as they are; only text gets parsed. Reading a deferred field
+    loads it like Django's own descriptor does.
+    """
 
     def __set__(self, instance, value):
-        parsed = self.field.to_python(value)
-        instance.__dict__[self.field.name] = parsed
+        if value is None or isinstance(value, date):
+            instance.__dict__[self.field.attname] = value
+        else:
+            instance.__dict__[self.field.attname] = self.field.to_python(value)
 
 
 class DateField(models.DateField):
@@ -203,64 +573,29 @@ class DateField(models.DateField):
         if value is None or isinstance(value, date):
             return value
 
-        formats = [
-            '%d %b %y',     # "14 FEB 24" or "14 FÉV 24"
-            '%d %B %y',
-            '%d %b %Y',
-            '%d %B %Y',
-            '%B %d %Y',     # "JULY 6 1997"
-            '%Y-%m-%d',     # "2018-10-25"
-            '%d.%m.%Y',     # "25.10.2019"
-            '%d/%m/%Y',
-            '%d/%m/%y',
-            '%y%m%d',
-            '%Y-%m',
-            '%y-%m',
-            '%Y',           # "2018"
-        ]
-
-        # Special handling for the '16 OF DECEMBER 20 19' format
-        value = re.sub(r'(\b19\b|\b20\b) (\d{2})$', r'\1\2', value)
-
-        # Special handling for month in '18 ABR/APR 2027' format
-        pattern = r' (?P<local_month>[A-ZÇĞİÖŞÜ]{3})/(?P<english_month>[A-ZÇĞİÖŞÜ]{3}) '
-        value = re.sub(pattern, r' \2 ', value, flags=re.UNICODE)
-
-        # Convert value to uppercase and remove special characters except slashes and dashes
-        value = re.sub(r'[^\w\s./-]|\.$', ' ', value).upper()
-        value = re.sub(r'\s\s+', ' ', value).strip()
-
-        # Remove suffixes from day values like '1ST' and '2ND', etc.
-        value = re.sub(r'\b(\d+)(?:ST|ND|RD|TH)\b', r'\1', value)
-
-        months = {
-            #'JAN': 'JAN',
-            'FÉV': 'FEB',
-            #'MAR': 'MAR',
-            'AVR': 'APR',
-            'MAI': 'MAY',
-            'JUI': 'JUN',
-            #'JUL': 'JUL',
-            'AOÛ': 'AUG',
-            #'SEP': 'SEP',
-            #'OCT': 'OCT',
-            #'NOV': 'NOV',
-            'DÉC': 'DEC',
-        }
-
-        for key, value_month in months.items():
-            value = value.replace(key, value_month)
-
-        # Regex to replace the duplicate month abbreviations
-        value = re.sub(r'\b(\w+)\b/\b\1\b', r'\1', value)
-
-        for fmt in formats:
-            try:
-                return datetime.strptime(value, fmt).date()
-            except ValueError:
+        parsed, normalized = parse_date_string(value)
+        if parsed is None:
+            raise ValidationError(f"Date format for '{normalized}' not recognized")
+        return parsed
+
+    def parse_many(self, values):
+        """
+        Parses a whole column like to_python() does. Returns (parsed,
+        errors): parsed has one value per row, None for empty and invalid
+        cells; errors lists (row index, raw value, message).
+        """
+        parsed = []
+        errors = []
+        for index, value in enumerate(values):
+            if value is None or value == '':
+                parsed.append(None)
                 continue
-
-        raise ValidationError(f"Date format for '{value}' not recognized")
+            try:
+                parsed.append(self.to_python(value))
+            except ValidationError as e:
+                parsed.append(None)
+                errors.append((index, value, e.messages[0]))
+        return parsed, errors
 
     #def from_db_value(self, value, expression, connection):
     #    if value is None:
@@ -310,6 +645,19 @@ class GenderField(models.CharField):
 
         return self.UNKNOWN
 
+    def parse_many(self, values):
+        """
+        to_python() for a whole column as (parsed, errors); a column has few
+        distinct values, each is parsed once.
+        """
+        seen = {}
+        parsed = []
+        for value in values:
+            if value not in seen:
+                seen[value] = self.to_python(value)
+            parsed.append(seen[value])
+        return parsed, []
+
     #def get_prep_value(self, value):
     #    if value is None:
     #        return value
@@ -376,8 +724,152 @@ class DotDict(dict):
     def __setitem__(self, key, value):
         super().__setitem__(key, self._convert_value(value))
 
+class DotView(UserDict):
+    """
+    DotDict's API over an existing dict without copying it: nested dicts and
+    lists are wrapped only when accessed, and the wrappers are kept in a
+    small side table. The wrapped dict is `data`, and writes go to it.
+    """
+
+    def __init__(self, data=None):
+        object.__setattr__(self, 'data', {} if data is None else data)
+        object.__setattr__(self, '_views', {})
+
+    def __getitem__(self, key):
+        value = self.data[key]
+        if value.__class__ in _VIEW_CLASSES:
+            view = self._views.get(key)
+            if view is None or view.data is not value:
+                view = self._views[key] = _VIEW_CLASSES[value.__class__](value)
+            return view
+        return value
+
+    def __setitem__(self, key, value):
+        self._views.pop(key, None)
+        self.data[key] = unwrap_view(value)
+
+    def __delitem__(self, key):
+        self._views.pop(key, None)
+        del self.data[key]
+
+    def __getattr__(self, attr):
+        # Through __dict__, so lookups before __init__ ran (copy, pickle)
+        # fail instead of recursing
+        state = self.__dict__
+        try:
+            value = state['data'][attr]
+        except KeyError:
+            raise AttributeError(f"'DotView' object has no attribute '{attr}'") from None
+        if value.__class__ in _VIEW_CLASSES:
+            view = state['_views'].get(attr)
+            if view is None or view.data is not value:
+                view = state['_views'][attr] = _VIEW_CLASSES[value.__class__](value)
+            return view
+        return value
+
+    def __setattr__(self, attr, value):
+        self[attr] = value
+
+    def __delattr__(self, attr):
+        try:
+            del self[attr]
+        except KeyError:
+            raise AttributeError(f"'DotView' object has no attribute '{attr}'") from None
+
+    def copy(self):
+        return DotView(self.data.copy())
+
+    __copy__ = copy
+
+
+class ListView(UserList):
+    """The list counterpart of DotView."""
+
+    def __init__(self, data=None):
+        self.data = [] if data is None else data
+        self._views = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ListView(self.data[index])
+        value = self.data[index]
+        if value.__class__ in _VIEW_CLASSES:
+            view = self._views.get(index)
+            if view is None or view.data is not value:
+                view = self._views[index] = _VIEW_CLASSES[value.__class__](value)
+            return view
+        return value
+
+    def __iter__(self):
+        for index in range(len(self.data)):
+            yield self[index]
+
+    def __setitem__(self, index, value):
+        self._views.clear()
+        self.data[index] = unwrap_view(value)
+
+    def __delitem__(self, index):
+        self._views.clear()
+        del self.data[index]
+
+    def append(self, value):
+        self.data.append(unwrap_view(value))
+
+    def insert(self, index, value):
+        self._views.clear()
+        self.data.insert(index, unwrap_view(value))
+
+    def copy(self):
+        return ListView(list(self.data))
+
+    def tolist(self):
+        # DRF's JSON encoder serializes anything with tolist() (numpy arrays)
+        return self.data
+
+    __copy__ = copy
+
+
+_VIEW_CLASSES = {dict: DotView, list: ListView, tuple: ListView}
+
+
+def unwrap_view(value):
+    return value.data if isinstance(value, (DotView, ListView)) else value
+
+
+def json_loads(value):
+    """json.loads(), through orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            # orjson is strict where json is not (NaN, Infinity)
+            pass
+    return json.loads(value)
+
+
+class LazyJSONDescriptor(DeferredAttribute):
+    """
+    Holds the plain decoded value of a lazy JSONField and wraps a dict in a
+    DotView on first read; nothing is copied, and rows that never touch the
+    field pay nothing beyond decoding.
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.field.attname, self)
+        if value is self:
+            value = super().__get__(instance, owner)
+        if value.__class__ is dict:
+            value = instance.__dict__[self.field.attname] = DotView(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
 class JSONField(models.JSONField):
-    def __init__(self, *args, default=dict, form_blank=None, db_null=None, encoder=None, **kwargs):
+    def __init__(self, *args, default=dict, form_blank=None, db_null=None, encoder=None, lazy=False, **kwargs):
         if 'blank' in kwargs:
             pass
             #TODO: enable the warning
@@ -400,12 +892,174 @@ class JSONField(models.JSONField):
             'encoder': serializers.CustomJSONEncoder,
         }
         defaults.update(kwargs)
+        self.lazy = lazy
+        if lazy:
+            self.descriptor_class = LazyJSONDescriptor
         super().__init__(*args, **defaults)
 
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.lazy:
+            kwargs['lazy'] = True
+        return name, path, args, kwargs
+
     def from_db_value(self, value, expression, connection):
-        """Converts JSON from the database into a DotDict."""
+        """
+        Converts JSON from the database into a DotDict; lazy fields leave
+        the dict as it is for their descriptor to wrap in a DotView. Values the backend already decoded are
+        not decoded again.
+        """
         if value is None:
             return None
-        if isinstance(value, str):
-            value = json.loads(value)  # Convert JSON string to dict
-        return DotDict(value) if isinstance(value, dict) else value
+        if isinstance(value, (str, bytes)):
+            try:
+                value = json.loads(value, cls=self.decoder) if self.decoder else json_loads(value)
+            except ValueError:
+                # Key transforms can return plain text (SQLite's json_extract)
+                return value
+        if self.lazy or not isinstance(value, dict):
+            return value
+        return DotDict(value)
+
+
+# One cell clean_rows() rejected; `row` is the index into its rows
+CellError = namedtuple('CellError', 'row field value message')
+
+def _parse_chunk(field, values, locale=None):
+    """parse_many() then the checks Model.clean_fields() runs on parsed values."""
+    parsed, errors = field.parse_many(values, locale=locale) if locale else field.parse_many(values)
+    failed = {index for index, _, _ in errors}
+    # Columns repeat values (countries, genders, dates), and choices checks
+    # are slow, so every distinct value is validated once. Keyed by the text
+    # too: Decimal('1.0') == Decimal('1.000'), but only one has 3 places.
+    messages = {}
+    for index, value in enumerate(parsed):
+        if index in failed or (field.blank and value in field.empty_values):
+            continue
+        key = (value.__class__, str(value))
+        if key not in messages:
+            try:
+                field.validate(value, None)
+                field.run_validators(value)
+                messages[key] = None
+            except ValidationError as e:
+                messages[key] = '; '.join(e.messages)
+        if messages[key] is not None:
+            parsed[index] = None
+            errors.append((index, values[index], messages[key]))
+    return parsed, errors
+
+
+def _clean_chunk(field, values):
+    cleaned = []
+    errors = []
+    for index, value in enumerate(values):
+        # Empty cells of blank fields are skipped like Model.clean_fields() does
+        if field.blank and value in field.empty_values:
+            cleaned.append(None if field.null else value)
+            continue
+        try:
+            cleaned.append(field.clean(value, None))
+        except ValidationError as e:
+            cleaned.append(None)
+            errors.append((index, value, '; '.join(e.messages)))
+    return cleaned, errors
+
+
+# Connections of the parent a forked worker inherited; referenced until the
+# worker exits, so they are never closed (and the parent's sessions ended)
+# from there
+_inherited_connections = []
+
+
+# Fields and raw columns of the clean_rows() call a forked worker serves;
+# set by its pool initializer, so only chunk bounds and results are pickled
+_batch_fields = None
+_batch_columns = None
+
+
+def _start_worker(fields, columns):
+    """Pool initializer: forked workers open their own database connections."""
+    global _batch_fields, _batch_columns
+    _batch_fields, _batch_columns = fields, columns
+    for connection in connections.all(initialized_only=True):
+        _inherited_connections.append(connection.connection)
+        connection.connection = None
+
+
+def _run_chunk(function, name, start, stop, *args):
+    return function(_batch_fields[name], _batch_columns[name][start:stop], *args)
+
+
+def clean_rows(model, rows, fields=None, processes=None, chunk_size=10000, locales=None):
+    """
+    Cleans import rows column by column, the batch counterpart of calling
+    full_clean() per instance. `rows` are mappings, or sequences ordered
+    like `fields` (default: the first row's keys); missing cells are None.
+    Columns whose field has parse_many() are parsed in one go and then
+    validated, the others go through field.clean() per value. With
+    `processes`, chunks of `chunk_size` rows are spread over a forked
+    process pool; relation columns, whose cleaning queries the database,
+    stay in this process and its connection. `locales` maps field names to
+    the locale of their numbers ('de' or 'en', see
+    DecimalField.detect_locale()); other columns decide it themselves.
+
+    Returns (columns, errors): columns maps each field name to one value
+    per row, None where the cell was rejected; errors lists CellErrors
+    ordered by row.
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    if fields is None:
+        fields = list(rows[0]) if rows else []
+    if rows and isinstance(rows[0], Mapping):
+        raw = {name: [row.get(name) for row in rows] for name in fields}
+    else:
+        raw = {name: [row[position] if position < len(row) else None for row in rows]
+               for position, name in enumerate(fields)}
+
+    model_fields = {name: model._meta.get_field(name) for name in fields}
+    size = chunk_size if processes else max(len(rows), 1)
+
+    tasks = []
+    for name, values in raw.items():
+        field = model_fields[name]
+        if not hasattr(field, 'parse_many'):
+            function, extra = _clean_chunk, ()
+        else:
+            # The whole column reads in one locale, whichever chunk a value is in
+            locale = (locales or {}).get(name)
+            if locale is None and processes and hasattr(field, 'detect_locale'):
+                locale = field.detect_locale(values)
+            function, extra = _parse_chunk, (locale,)
+        for start in range(0, len(values), size):
+            tasks.append((name, start, function, extra))
+
+    def run(name, start, function, extra):
+        return function(model_fields[name], raw[name][start:start + size], *extra)
+
+    if processes:
+        # Handed over by fork, not pickled: the workers get them as initargs
+        with multiprocessing.get_context('fork').Pool(
+                processes, initializer=_start_worker, initargs=(model_fields, raw)) as pool:
+            pending = {position: pool.apply_async(_run_chunk, (function, name, start, start + size, *extra))
+                       for position, (name, start, function, extra) in enumerate(tasks)
+                       if not model_fields[name].is_relation}
+            results = [pending[position].get() if position in pending else run(*task)
+                       for position, task in enumerate(tasks)]
+    else:
+        results = [run(*task) for task in tasks]
+
+    columns = {name: [] for name in fields}
+    errors = []
+    for (name, start, _, _), (values, chunk_errors) in zip(tasks, results):
+        columns[name].extend(values)
+        errors.extend(CellError(start + index, name, value, message) for index, value, message in chunk_errors)
+    errors.sort(key=lambda error: error.row)
+    return columns, errors
+
+
+def build_instances(model, columns, errors=()):
+    """Unsaved `model` instances from clean_rows() columns, skipping rows with errors; for bulk_create()."""
+    failed = {error.row for error in errors}
+    names = list(columns)
+    return [model(**dict(zip(names, values))) for index, values in enumerate(zip(*columns.values())) if index not in failed]
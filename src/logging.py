@@ -1,9 +1,18 @@
+import json
+import logging
 import os
+import queue
 import shutil
 import sys
+import threading
+import time
 import types
+import weakref
+from collections import Counter, OrderedDict, deque
 from datetime import datetime
 
+from django.utils.module_loading import import_string
+
 from rich.console import Console
 from rich.highlighter import Highlighter, RegexHighlighter
 from rich.logging import RichHandler
@@ -15,6 +24,141 @@ from .middleware import RequestIDMiddleware
 
 pretty = pretty_repr
 
+def is_lambda(f):
+    return isinstance(f, types.FunctionType) and f.__name__ == "<lambda>"
+
+def annotate_record(record):
+    """
+    Stamps the record with the current request id, the milliseconds since
+    the request started (`relativeCreated`) and whether it is the request's
+    first message. Only reads the request thread's state, so it is cheap
+    and must run on the logging thread; repeated calls keep the first stamp.
+    """
+    if getattr(record, 'annotated', False):
+        return
+    current_time = datetime.fromtimestamp(record.created)
+    request_id = RequestIDMiddleware.get_request_id()
+    request_start_time = RequestIDMiddleware.get_request_start_time()
+
+    record.request_id = request_id
+    if request_id is not None:
+        if request_start_time is None:
+            RequestIDMiddleware.set_request_start_time(current_time)
+            record.relativeCreated = 0
+        else:
+            time_since_first_log = current_time - request_start_time
+            record.relativeCreated = time_since_first_log.total_seconds() * 1000  # Convert to milliseconds
+    else:
+        record.relativeCreated = 0
+
+    record.first_in_request = not RequestIDMiddleware.is_first_log_message()
+    RequestIDMiddleware.set_first_log_message_sent()
+    record.annotated = True
+
+
+def is_print_style(msg):
+    return not isinstance(msg, str) or '%' not in msg
+
+
+def format_print_style(msg, args):
+    """
+    djultra's print-style convention: `logger.debug('POST data: ', data)`
+    appends the arguments to the message instead of %-formatting them.
+    """
+    if isinstance(args, tuple):
+        filtered_args = [a for a in args if not is_lambda(a)]
+
+        if not filtered_args:
+            return str(msg)
+        elif len(filtered_args) == 1 and isinstance(filtered_args[0], list):
+            return f'{msg}{pretty(filtered_args[0])}'
+        else:
+            return str(msg) + ' '.join(map(str, filtered_args))
+    # A single dict argument, which LogRecord unpacks from the args tuple
+    return f'{msg} {pretty(args)}'
+
+
+class LogRecord(logging.LogRecord):
+    """
+    Formats print-style calls in getMessage(), so the arguments are only
+    rendered once a handler has passed its level and filter checks and
+    actually outputs the record.
+    """
+
+    def getMessage(self):
+        if is_print_style(self.msg):
+            return format_print_style(self.msg, self.args)
+        return super().getMessage()
+
+
+# A factory installed by someone else is left alone; prepare_record() formats
+# print-style calls on those records instead
+if logging.getLogRecordFactory() is logging.LogRecord:
+    logging.setLogRecordFactory(LogRecord)
+
+
+def prepare_record(record):
+    """
+    Common part of the djultra handlers' emit(): annotates the record (see
+    annotate_record()) and turns print-style calls on records not created
+    as djultra LogRecords into a plain message.
+    """
+    annotate_record(record)
+
+    if not isinstance(record, LogRecord) and is_print_style(record.msg):
+        record.msg = format_print_style(record.msg, record.args)
+        record.args = ()  # Clear args to avoid further formatting issues
+
+class DeduplicateFilter(logging.Filter):
+    """
+    Rate limits repeated records per call site: within `window` seconds,
+    only the first `burst` records with the same logger, line number and
+    message template get through. The first record let through after the
+    window carries a "suppressed N similar" note. Suppressed records are
+    counted per call site in the class-level `suppressed` counter, e.g.
+    for exposing as a metric.
+    """
+
+    suppressed = Counter()
+
+    def __init__(self, window=10, burst=1, max_sites=1000):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.max_sites = max_sites
+        # (logger, lineno, template) -> [window start, records in window, suppressed]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        template = record.msg if isinstance(record.msg, str) else type(record.msg)
+        key = (record.name, record.lineno, template)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or record.created - site[0] >= self.window:
+                if site is None and len(self._sites) >= self.max_sites:
+                    self._expire(record.created)
+                self._sites[key] = [record.created, 1, 0]
+                if site and site[2]:
+                    record.msg = f'{record.getMessage()} (suppressed {site[2]} similar)'
+                    record.args = ()
+                return True
+            site[1] += 1
+            if site[1] <= self.burst:
+                return True
+            site[2] += 1
+            DeduplicateFilter.suppressed[f'{record.name}:{record.lineno}'] += 1
+        return False
+
+    def _expire(self, now):
+        # Suppression counts of expired sites are lost; they are in `suppressed`
+        for key, site in list(self._sites.items()):
+            if now - site[0] >= self.window:
+                del self._sites[key]
+        if len(self._sites) >= self.max_sites:
+            self._sites.clear()
+
+
 class RainbowHighlighter(Highlighter):
     def highlight(self, text):
         for index in range(len(text)):
@@ -73,9 +217,6 @@ class CustomRichHandler(RichHandler):
         self._time_column_width = 8
 
 
-    def is_lambda(self, f):
-        return isinstance(f, types.FunctionType) and f.__name__ == "<lambda>"
-
     def get_terminal_width(self):
         default_columns = int(os.getenv('DEFAULT_TERMINAL_COLUMNS', 80))  # Set a default or use environment variable
         try:
@@ -85,47 +226,18 @@ class CustomRichHandler(RichHandler):
             return default_columns
 
     def emit(self, record):
-        current_time = datetime.fromtimestamp(record.created)
-        request_id = RequestIDMiddleware.get_request_id()
-        request_start_time = RequestIDMiddleware.get_request_start_time()
-
-        if request_id is not None:
-            if request_start_time is None:
-                RequestIDMiddleware.set_request_start_time(current_time)
-                record.relativeCreated = 0
-            else:
-                time_since_first_log = current_time - request_start_time
-                record.relativeCreated = time_since_first_log.total_seconds() * 1000  # Convert to milliseconds
-        else:
-            record.relativeCreated = 0
-
-        if ((not isinstance(record.msg, str)) or ('%' not in record.msg)): # and isinstance(record.args, tuple):
-            if isinstance(record.args, tuple):
-                filtered_args = [a for a in record.args if not self.is_lambda(a)]
-                
-                if not filtered_args:
-                    record.msg = str(record.msg)
-                elif len(filtered_args) == 1 and isinstance(filtered_args[0], list):
-                    record.msg = f'{record.msg}{pretty(filtered_args[0])}'
-                else:
-                    record.msg = str(record.msg) + ' '.join(map(str, filtered_args))
-                record.args = ()
-            else:
-                record.msg = f'{record.msg} {pretty(record.args)}'
-            record.args = ()  # Clear args to avoid further formatting issues
-
+        prepare_record(record)
         super().emit(record)
 
     def custom_log_render(self, record, traceback, message_renderable, time_format=None, level_width=None, omit_path=False, link_path=False):
         log_time = datetime.fromtimestamp(record.created)
         log_time_highlight = True
-        if not RequestIDMiddleware.is_first_log_message() or record.relativeCreated == 0:
+        if getattr(record, 'first_in_request', True) or record.relativeCreated == 0:
             if self.formatter:
                 time_display = self.formatter.formatTime(record, self.formatter.datefmt)
             else:
                 time_display = log_time.strftime('%Y-%m-%d %H:%M:%S')
             #self._time_column_width = len(time_display.strip())
-            RequestIDMiddleware.set_first_log_message_sent()
         else:
             time_display = f"+{record.relativeCreated:.0f}ms"
             log_time_highlight = False
@@ -199,3 +311,253 @@ class CustomRichHandler(RichHandler):
     #def debug(self, *args, **kwargs):
     #    print('DEBUG!!!')
     #    self._log(logging.DEBUG, args[0], args[1:], **kwargs)
+
+
+class StructuredHandler(logging.StreamHandler):
+    """
+    Production counterpart of CustomRichHandler: same emit() contract
+    (request id, relative milliseconds, print-style arguments), but each
+    record becomes one compact JSON line or logfmt line, without Rich, for
+    log collectors reading a pipe.
+    """
+
+    def __init__(self, stream=None, format='json'):
+        super().__init__(stream or sys.stdout)
+        if format not in ('json', 'logfmt'):
+            raise ValueError(f"Unknown log format '{format}', expected 'json' or 'logfmt'")
+        self.render = self.render_json if format == 'json' else self.render_logfmt
+        self.exception_formatter = logging.Formatter()
+
+    def emit(self, record):
+        try:
+            prepare_record(record)
+            self.stream.write(self.render(self.get_fields(record)) + self.terminator)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def get_fields(self, record):
+        fields = {
+            'time': f'{time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))}.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'line': record.lineno,
+            'request_id': record.request_id,
+            'ms': round(record.relativeCreated, 1),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            fields['exc_info'] = self.exception_formatter.formatException(record.exc_info)
+        elif record.exc_text:
+            fields['exc_info'] = record.exc_text
+        if record.stack_info:
+            fields['stack_info'] = record.stack_info
+        return fields
+
+    def render_json(self, fields):
+        return json.dumps(fields, default=str, ensure_ascii=False, separators=(',', ':'))
+
+    def render_logfmt(self, fields):
+        parts = []
+        for key, value in fields.items():
+            if value is None:
+                continue
+            value = str(value)
+            if not value or any(c in value for c in ' ="\n\\'):
+                value = json.dumps(value, ensure_ascii=False)
+            parts.append(f'{key}={value}')
+        return ' '.join(parts)
+
+
+def build_handler(config):
+    """
+    Instantiates a handler from a dictConfig-style dict. `formatter` is the
+    formatter's own dict (`format`, `datefmt`) rather than a name, since
+    nested handlers are created outside of dictConfig.
+    """
+    config = dict(config)
+    handler_class = import_string(config.pop('class'))
+    level = config.pop('level', logging.NOTSET)
+    formatter = config.pop('formatter', None)
+    handler = handler_class(**config)
+    handler.setLevel(level)
+    if formatter:
+        handler.setFormatter(logging.Formatter(formatter.get('format'), formatter.get('datefmt')))
+    return handler
+
+
+class QueuedHandler(logging.Handler):
+    """
+    Takes logging off the request thread: emit() only annotates the record
+    and puts it into a bounded queue; a listener thread renders and writes
+    it with the wrapped handler. When the queue is full, `overflow='drop'`
+    discards the record (and reports the count later), `overflow='block'`
+    waits for room. exc_info is kept on the record, so tracebacks are
+    rendered by the listener exactly as they would be inline.
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, handler, maxsize=10000, overflow='drop', level=logging.NOTSET):
+        super().__init__(level)
+        if overflow not in ('drop', 'block'):
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected 'drop' or 'block'")
+        self.target = handler if isinstance(handler, logging.Handler) else build_handler(handler)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.start()
+        QueuedHandler.instances.add(self)
+
+    def start(self):
+        self.queue = queue.Queue(self.maxsize)
+        self._reported_dropped = self.dropped
+        self._thread = threading.Thread(target=self._run, name='djultra-log-writer', daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            annotate_record(record)
+            if self.overflow == 'block':
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    break
+                self.report_dropped()
+                if record.levelno >= self.target.level:
+                    self.target.handle(record)
+            except Exception:
+                self.target.handleError(record)
+            finally:
+                self.queue.task_done()
+
+    def report_dropped(self):
+        dropped = self.dropped - self._reported_dropped
+        if dropped:
+            self._reported_dropped += dropped
+            self.target.handle(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                f'Log queue full, dropped {dropped} records', (), None))
+
+    def flush(self):
+        """Wait until everything enqueued so far has been written."""
+        if self._thread.is_alive():
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        QueuedHandler.instances.discard(self)
+        if self._thread.is_alive():
+            # Blocking put: the end marker must not be dropped on a full queue
+            self.queue.put(None)
+            self._thread.join()
+        self.target.close()
+        super().close()
+
+
+def _restart_queued_handlers():
+    # Threads do not survive a fork and the queue's lock may be held by one
+    # that didn't, so a forked worker starts its open handlers over
+    for handler in list(QueuedHandler.instances):
+        handler.start()
+
+
+os.register_at_fork(after_in_child=_restart_queued_handlers)
+
+
+def get_level(level):
+    """Level number for a level given as number or name ('ERROR')."""
+    return level if isinstance(level, int) else logging.getLevelName(level.upper())
+
+
+class RequestBufferHandler(logging.Handler):
+    """
+    Tail-based logging: records at or above `threshold` go straight to the
+    wrapped handler, lower ones are held back per request (by the request id
+    RequestIDMiddleware tracks), at most `capacity` per request, keeping the
+    latest. The request's buffer is written out when it logs a record at
+    `flush_level` or higher, or when it ends with a 5xx status or took
+    `slow_ms` or longer (see end_request()); otherwise it is dropped.
+    Records outside of a request only pass `threshold`.
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, handler, threshold=logging.ERROR, flush_level=logging.ERROR, capacity=1000,
+                 slow_ms=1000, max_requests=1000, level=logging.NOTSET):
+        super().__init__(level)
+        self.target = handler if isinstance(handler, logging.Handler) else build_handler(handler)
+        self.threshold = get_level(threshold)
+        self.flush_level = get_level(flush_level)
+        self.capacity = capacity
+        self.slow_ms = slow_ms
+        self.max_requests = max_requests
+        # request id -> deque of held back records, or None once flushed
+        self._buffers = OrderedDict()
+        self._buffer_lock = threading.Lock()
+        RequestBufferHandler.instances.add(self)
+
+    def emit(self, record):
+        try:
+            annotate_record(record)
+            request_id = record.request_id
+            if request_id is None:
+                if record.levelno >= self.threshold:
+                    self.target.handle(record)
+                return
+
+            if record.levelno >= self.flush_level:
+                self.flush_request(request_id)
+            with self._buffer_lock:
+                buffer = self._buffers.get(request_id, ())
+                if buffer is not None and record.levelno < self.threshold:
+                    if not buffer:
+                        if len(self._buffers) >= self.max_requests:
+                            # Requests that never ended (e.g. the thread died)
+                            self._buffers.popitem(last=False)
+                        buffer = self._buffers[request_id] = deque(maxlen=self.capacity)
+                    buffer.append(record)
+                    return
+            self.target.handle(record)
+        except Exception:
+            self.handleError(record)
+
+    def flush_request(self, request_id):
+        """Write out the request's held back records; later ones pass through."""
+        with self._buffer_lock:
+            buffer = self._buffers.get(request_id)
+            self._buffers[request_id] = None
+        for record in buffer or ():
+            if record.levelno >= self.target.level:
+                self.target.handle(record)
+
+    def end_request(self, request_id, status_code=None, duration_ms=None):
+        if (status_code is not None and status_code >= 500) or (duration_ms is not None and duration_ms >= self.slow_ms):
+            self.flush_request(request_id)
+        with self._buffer_lock:
+            self._buffers.pop(request_id, None)
+
+    def flush(self):
+        self.target.flush()
+
+    def close(self):
+        self.target.close()
+        super().close()
+
+
+def end_request(request_id, status_code=None, duration_ms=None):
+    """Called by RequestIDMiddleware when a request is done."""
+    for handler in list(RequestBufferHandler.instances):
+        handler.end_request(request_id, status_code, duration_ms)
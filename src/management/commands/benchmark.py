@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from djultra import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run djultra's micro-benchmarks and print the time per call. With "
+        "--check, fail when a result exceeds its budget relative to the "
+        "topic's baseline (for CI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("topics", nargs="*", help=f"Topics to run (default: {', '.join(benchmarks.TOPICS)})")
+        parser.add_argument("--number", type=int, default=10000, help="Calls per measurement round")
+        parser.add_argument("--check", action="store_true", help="Fail when a result is over its budget")
+
+    def handle(self, *args, **options):
+        topics = options["topics"] or benchmarks.TOPICS
+        for topic in topics:
+            if topic not in benchmarks.TOPICS:
+                raise CommandError(f"Unknown benchmark topic: {topic}")
+
+        failures = []
+        for topic in topics:
+            self.stdout.write(f"{topic}:")
+            results = benchmarks.run(topic, options["number"])
+            for result in results:
+                if result.unit == "%":
+                    self.stdout.write(f"  {result.name:<45} {result.value:10.1%}")
+                elif result.unit == "B":
+                    self.stdout.write(f"  {result.name:<45} {result.value:10,.0f} B")
+                else:
+                    self.stdout.write(f"  {result.name:<45} {result.value * 1e6:10.2f} µs {1 / result.value:14,.0f}/s")
+            if options["check"]:
+                failures += benchmarks.check(topic, results)
+
+        if failures:
+            raise CommandError("Over budget: " + ", ".join(
+                f"{name} at {ratio:.1f}x baseline (budget {budget}x)" for name, ratio, budget in failures
+            ))
@@ -14,6 +14,8 @@ import django.core.management as mgmt
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+from djultra import tracing
+
 logger = logging.getLogger(__name__)
 
 ENV_PREFIX        = "DJU_DEV_FASTMANAGE"
@@ -122,8 +124,11 @@ class FastmanageDaemon:
 
         sys.argv = argv
         status = 0
+        command = argv[1] if len(argv) > 1 else ""
         try:
-            mgmt.ManagementUtility().execute(use_socket=False)
+            # Child of the client's span, passed in its environment
+            with tracing.start_span(f"manage.py {command}", env.get("TRACEPARENT"), kind=tracing.KIND_SERVER):
+                mgmt.ManagementUtility().execute(use_socket=False)
         except SystemExit as exc:
             if exc.code is None:
                 status = 0
@@ -14,6 +14,8 @@ from pathlib import Path
 
 import django.core.management as mgmt
 
+from djultra import tracing
+
 def dbg(msg):
     return
     ts = time.strftime('%Y-%m-%d %H:%M:%S.%f')
@@ -51,30 +53,38 @@ class SocketManagementUtility(mgmt.ManagementUtility):
             return super().execute(*args, **kwargs)
             #raise SystemExit(f"fastmanage: could not connect to daemon: {e}\nMaybe stale socket? {self.sock_path}")
 
-        # Serialize environment and command
-        env_json = json.dumps(dict(os.environ)).encode()
-        cmd = (shlex.join(self.argv) + "\n").encode()
-        payload = env_json + b"\n" + cmd
-
-        #dbg(f"Client payload: {payload}")
-
-        anc = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [0, 1, 2]).tobytes())]
-        cli.sendmsg([payload], anc)
-
-        status_raw = b""
-        while True:
-            chunk = cli.recv(4096)
-            if not chunk:
-                break
-            status_raw += chunk
-        cli.close()
-        if status_raw:
-            try:
-                status = int(status_raw.strip())
-            except ValueError as exc:
-                raise SystemExit(f"fastmanage: invalid exit status payload {status_raw!r}") from exc
-            if status:
-                raise SystemExit(status)
+        # Continues a trace passed in by the caller, if any; the worker
+        # continues ours through TRACEPARENT in its environment
+        command = self.argv[1] if len(self.argv) > 1 else ""
+        with tracing.start_span(f"fastmanage {command}", os.environ.get("TRACEPARENT"), kind=tracing.KIND_CLIENT) as span:
+            env = dict(os.environ)
+            if span is not None:
+                env["TRACEPARENT"] = span.traceparent
+
+            # Serialize environment and command
+            env_json = json.dumps(env).encode()
+            cmd = (shlex.join(self.argv) + "\n").encode()
+            payload = env_json + b"\n" + cmd
+
+            #dbg(f"Client payload: {payload}")
+
+            anc = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [0, 1, 2]).tobytes())]
+            cli.sendmsg([payload], anc)
+
+            status_raw = b""
+            while True:
+                chunk = cli.recv(4096)
+                if not chunk:
+                    break
+                status_raw += chunk
+            cli.close()
+            if status_raw:
+                try:
+                    status = int(status_raw.strip())
+                except ValueError as exc:
+                    raise SystemExit(f"fastmanage: invalid exit status payload {status_raw!r}") from exc
+                if status:
+                    raise SystemExit(status)
 
 # Patch Django globally
 mgmt.ManagementUtility = SocketManagementUtility
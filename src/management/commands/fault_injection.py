@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djultra import services
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        "List the FAULT_INJECTION rules or switch them on and off at runtime. "
+        "Switches are stored in the cache; running processes follow them if "
+        "they share the cache backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["list", "enable", "disable", "reset"])
+        parser.add_argument("rule", nargs="?", help="Rule name; required for enable/disable, optional for reset")
+
+    def handle(self, *args, **options):
+        injector = services.fault_injection.FaultInjector.from_settings()
+        action = options["action"]
+        name = options["rule"]
+
+        if action in ("enable", "disable"):
+            if not name:
+                raise CommandError(f"{action} needs a rule name")
+            try:
+                injector.set_enabled(name, action == "enable")
+            except KeyError:
+                raise CommandError(f"Unknown rule: {name}")
+        elif action == "reset":
+            injector.reset(name)
+
+        for rule in injector.rules:
+            state = "on" if injector.is_enabled(rule) else "off"
+            self.stdout.write(f"{rule.name}: {state} (path={rule.path.pattern})")
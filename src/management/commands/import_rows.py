@@ -0,0 +1,61 @@
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from djultra.services import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a CSV or XLSX file into a model in chunks, cleaning each chunk "
+        "with the model's fields and writing it with bulk_create() (COPY on "
+        "PostgreSQL). Rejected rows can be written to a side file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Model as app_label.ModelName")
+        parser.add_argument("path", help="CSV or XLSX file")
+        parser.add_argument("--map", action="append", default=[], metavar="HEADER=FIELD",
+                            help="Map a column to a field; other columns match by field name or verbose name")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per chunk and transaction")
+        parser.add_argument("--processes", type=int, help="Clean chunks in a pool of this many processes")
+        parser.add_argument("--rejects", help="Write rejected rows with their errors to this CSV file")
+        parser.add_argument("--delimiter", help="CSV delimiter (default: sniffed)")
+        parser.add_argument("--sheet", help="XLSX sheet (default: the first)")
+        parser.add_argument("--no-copy", action="store_true", help="Use bulk_create() even on PostgreSQL")
+        parser.add_argument("--database", help="Database alias (default: the router's choice)")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model: {options['model']}")
+
+        columns = {}
+        for item in options["map"]:
+            header, sep, field = item.partition("=")
+            if not sep:
+                raise CommandError(f"--map needs HEADER=FIELD, got: {item}")
+            columns[header] = field
+
+        read_kwargs = {}
+        if options["delimiter"]:
+            read_kwargs["delimiter"] = options["delimiter"]
+        if options["sheet"]:
+            read_kwargs["sheet"] = options["sheet"]
+
+        try:
+            stats = importer.import_rows(
+                model, options["path"], columns=columns, chunk_size=options["chunk_size"],
+                processes=options["processes"], rejects=options["rejects"],
+                use_copy=False if options["no_copy"] else None, using=options["database"],
+                progress=self.report, **read_kwargs,
+            )
+        except (OSError, ImportError, ValueError, FieldDoesNotExist) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Imported {stats.imported} of {stats.rows} rows in {stats.seconds:.1f}s, rejected {stats.rejected}")
+
+    def report(self, stats):
+        rate = stats.rows / stats.seconds if stats.seconds else 0
+        self.stdout.write(f"  {stats.rows:,} rows, {stats.imported:,} imported, {stats.rejected:,} rejected ({rate:,.0f} rows/s)")
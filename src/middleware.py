@@ -4,13 +4,26 @@ import logging
 import re
 import threading
 import time
+from contextlib import ExitStack
+from datetime import datetime
 from http.cookies import Morsel
 
 import requests
+import requests.adapters
 from django.apps import apps
 from django.conf import settings
-from django.db import IntegrityError, connection
-from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import IntegrityError, connection, connections
+from django.http import HttpRequest, HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+
+from djultra import services, tracing
+from djultra.wsgi import parse_epoch
 
 logger = logging.getLogger(__name__)
 
@@ -21,23 +34,47 @@ class RequestIDMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        # HTTP_X_REQUEST_ID and HTTP_X_START_TIME are set in wsgi.py
+        # HTTP_X_REQUEST_ID and HTTP_X_START_TIME are set by djultra.wsgi
+        # (or the project's own wsgi.py)
         request_id = request.META.get('HTTP_X_REQUEST_ID')
         start_time = request.META.get('HTTP_X_START_TIME')
         RequestIDMiddleware._thread_locals.request = request
         RequestIDMiddleware._thread_locals.request_id = request_id
         RequestIDMiddleware._thread_locals.start_time = start_time
         RequestIDMiddleware._thread_locals.first_log_message_sent = False
+        started = time.monotonic()
 
         # Log the request ID at the start of the request
         logger.info(f'<Request> "{request.method} {request.path}" id={request_id}')
         #logger.info(f"Request start time: {start_time}")
 
-        # Add the nonce to the request for CSP
-        #request.csp_nonce = request_id  # Using request_id as nonce
-        setattr(request, "_csp_nonce", request_id)
-
-        response = self.get_response(request)
+        # The CSP nonce is left to django-csp, which draws a random one when a
+        # template asks for it; request ids are predictable and must not be used
+        #setattr(request, "_csp_nonce", request_id)
+
+        # A view that raises ends the request as a server error; its buffered
+        # records are the ones worth keeping
+        status_code = 500
+        try:
+            # Root span of the request, continuing the caller's trace if it sent
+            # a traceparent header
+            with tracing.start_span(f'{request.method} {request.path}', request.META.get('HTTP_TRACEPARENT'),
+                                    kind=tracing.KIND_SERVER) as span:
+                response = self.get_response(request)
+                status_code = response.status_code
+                if span is not None:
+                    span.set_attribute('http.request.method', request.method)
+                    span.set_attribute('url.path', request.path)
+                    span.set_attribute('http.response.status_code', response.status_code)
+                    if request_id is not None:
+                        span.set_attribute('djultra.request_id', request_id)
+                    if response.status_code >= 500:
+                        span.set_error(f'HTTP {response.status_code}')
+        finally:
+            if request_id is not None:
+                # Imported here, djultra.logging imports this module
+                from djultra.logging import end_request
+                end_request(request_id, status_code, (time.monotonic() - started) * 1000)
         return response
 
     @staticmethod
@@ -68,6 +105,78 @@ class RequestIDMiddleware:
     def set_request_start_time(start_time):
         RequestIDMiddleware._thread_locals.start_time = start_time
 
+def get_queue_time(start_time, now=None):
+    """
+    Seconds between `start_time` (as stamped by wsgi.py or a proxy) and `now`.
+    Accepts a datetime, epoch seconds as number or string, and proxy-style
+    values like "t=1718000000.123" or epoch milli-/microseconds.
+    """
+    if start_time is None:
+        return None
+    if isinstance(start_time, datetime):
+        now = now or (datetime.now(start_time.tzinfo))
+        return (now - start_time).total_seconds()
+    start = parse_epoch(start_time)
+    if start is None:
+        return None
+    now = now.timestamp() if isinstance(now, datetime) else (now or time.time())
+    return now - start
+
+class LoadSheddingMiddleware:
+    """
+    Rejects (503 + Retry-After) or degrades requests that waited in the
+    server queue longer than the threshold of the first matching rule, before
+    any view work is done. Configured via settings.LOAD_SHEDDING:
+
+        LOAD_SHEDDING = {
+            'rules': [
+                {'path': r'^/api/reports/', 'max_queue_seconds': 1, 'action': 'degrade',
+                 'view': 'project.views.reports_unavailable'},
+                {'path': r'^/', 'max_queue_seconds': 5},
+            ],
+            'exempt': [r'^/admin'],
+            'retry_after': 5,
+        }
+
+    Not loaded at all when no rules are configured.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'LOAD_SHEDDING', {})
+        self.rules = [
+            {**rule, 'path': re.compile(rule.get('path', r'^/'))}
+            for rule in config.get('rules', [])
+        ]
+        if not self.rules:
+            raise MiddlewareNotUsed
+        self.exempt = [re.compile(pattern) for pattern in config.get('exempt', [r'^/admin'])]
+        self.retry_after = config.get('retry_after', 5)
+
+    def __call__(self, request):
+        queue_time = get_queue_time(request.META.get('HTTP_X_START_TIME'))
+        if queue_time is not None:
+            rule = self.get_rule(request.path)
+            if rule and queue_time > rule['max_queue_seconds']:
+                return self.shed(request, rule, queue_time)
+        return self.get_response(request)
+
+    def get_rule(self, path):
+        if any(pattern.match(path) for pattern in self.exempt):
+            return None
+        for rule in self.rules:
+            if rule['path'].match(path):
+                return rule
+        return None
+
+    def shed(self, request, rule, queue_time):
+        action = rule.get('action', 'reject')
+        logger.warning(f'Shedding request "{request.method} {request.path}" queue_time={queue_time:.3f}s action={action}')
+        if action == 'degrade':
+            return import_string(rule['view'])(request)
+        response = HttpResponse('Service temporarily overloaded, please retry.', status=503, content_type='text/plain')
+        response['Retry-After'] = str(rule.get('retry_after', self.retry_after))
+        return response
+
 class AdminActionLoggerMiddleware():
     def __init__(self, get_response):
         self.get_response = get_response
@@ -80,7 +189,8 @@ class AdminActionLoggerMiddleware():
             if 'action' in request.POST:
                 model = self.get_model_from_path(request.path)
                 # request.POST is a Django QueryDict
-                logger.debug('POST data: ', request.POST.dict())
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('POST data: ', request.POST.dict())
                 #logger.debug(f"POST data urlencoded: {pretty(request.POST.urlencode())}")
                 if model:
                     action_data = {
@@ -156,39 +266,152 @@ class AdjustSequenceMiddleware():
 
 class DevProxyMiddleware:
     """
-    Probably not needed anymore, UNUSED
+    Proxies requests under DEV_PROXY['prefix'] (default /static/frontend/) to
+    the Vite dev server, for a dev setup where Django serves the SPA.
+
+    All instances share one pooled, keep-alive requests session. Conditional
+    and encoding request headers are forwarded, 304s are passed through and,
+    with DEV_PROXY['stream'] on (default), bodies are streamed to the client
+    undecoded instead of being buffered.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
+    forward_request_headers = ('Accept', 'Accept-Encoding', 'If-None-Match', 'If-Modified-Since', 'Range', 'If-Range')
+    hop_by_hop_headers = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+                          'trailers', 'transfer-encoding', 'upgrade'}
 
-    def __call__(self, request):
-        logger.debug(f'Considering {request.path}')
-        if request.path.startswith('/static/frontend/'):
-            svelte_dev_server_url = f'http://localhost:5173{request.path}'
-            logger.debug(f'Proxying to {svelte_dev_server_url}')
-            try:
-                response = requests.get(svelte_dev_server_url)
-                headers = {key: value for key, value in response.headers.items() if key in [
-                    'Content-Type', 'Content-Length', 'Last-Modified', 'Cache-Control', 'ETag']}
-                return HttpResponse(response.content, status=response.status_code, headers=headers)
-            except requests.exceptions.RequestException:
-                return HttpResponseNotFound()
-        return self.get_response(request)
+    _session = None
+    _session_lock = threading.Lock()
 
-class AdminSessionMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        config = getattr(settings, 'DEV_PROXY', {})
+        self.url = config.get('url', getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')).rstrip('/')
+        self.prefix = config.get('prefix', '/static/frontend/')
+        self.stream = config.get('stream', True)
+        self.timeout = config.get('timeout', 10)
+        self.chunk_size = config.get('chunk_size', 64 * 1024)
+        self.pool_size = config.get('pool_size', 20)
+
+    @classmethod
+    def get_session(cls, pool_size):
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    cls._session = session
+        return cls._session
 
     def __call__(self, request):
-        #logger.debug(f'Cookies: {pretty(request.COOKIES)}')
-        #logger.debug(f'Original session cookie name: {settings.SESSION_COOKIE_NAME}')
-        if request.path.startswith('/admin'):
-            settings.SESSION_COOKIE_NAME = 'admin_session_id'
-            #logger.debug(f'Detected admin session, using session cookie {settings.SESSION_COOKIE_NAME}')
+        if not request.path.startswith(self.prefix):
+            return self.get_response(request)
+
+        url = f'{self.url}{request.get_full_path()}'
+        logger.debug(f'Proxying to {url}')
+        headers = {name: request.headers[name] for name in self.forward_request_headers if name in request.headers}
+        try:
+            upstream = self.get_session(self.pool_size).get(url, headers=headers, stream=True, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            return HttpResponseNotFound()
+
+        response_headers = {key: value for key, value in upstream.headers.items()
+                            if key.lower() not in self.hop_by_hop_headers}
+
+        # Bodies are passed on as received, so Content-Encoding and
+        # Content-Length stay valid
+        if self.stream and upstream.status_code != 304:
+            response = StreamingHttpResponse(self.iter_upstream(upstream), status=upstream.status_code,
+                                             headers=response_headers)
+            # Closing the response (also on HEAD requests and client
+            # disconnects, before any chunk was read) hands the connection
+            # back to the pool; FileResponse closes its file the same way
+            response._resource_closers.append(upstream.close)
+            return response
+
+        try:
+            content = upstream.raw.read(decode_content=False)
+        finally:
+            upstream.close()
+        return HttpResponse(content, status=upstream.status_code, headers=response_headers)
+
+    def iter_upstream(self, upstream):
+        yield from upstream.raw.stream(self.chunk_size, decode_content=False)
+
+class AdminSessionMiddleware(SessionMiddleware):
+    """
+    Drop-in replacement for Django's SessionMiddleware that keeps a Django
+    Admin session in parallel to an API session by using a separate session
+    cookie for each. The cookie name is picked per request and never written
+    to settings, so concurrent admin and API requests on threaded servers
+    cannot pick up each other's cookie.
+    """
+    admin_path_prefix = '/admin'
+    admin_cookie_name = 'admin_session_id'
+    api_cookie_name = 'api_session_id'
+
+    def get_cookie_name(self, request):
+        if request.path.startswith(self.admin_path_prefix):
+            return self.admin_cookie_name
+        return self.api_cookie_name
+
+    def process_request(self, request):
+        request.session_cookie_name = self.get_cookie_name(request)
+        session_key = request.COOKIES.get(request.session_cookie_name)
+        request.session = self.SessionStore(session_key)
+
+    def process_response(self, request, response):
+        # Same as SessionMiddleware.process_response(), with the per-request
+        # cookie name in place of settings.SESSION_COOKIE_NAME
+        try:
+            accessed = request.session.accessed
+            modified = request.session.modified
+            empty = request.session.is_empty()
+            cookie_name = request.session_cookie_name
+        except AttributeError:
+            return response
+
+        if cookie_name in request.COOKIES and empty:
+            response.delete_cookie(
+                cookie_name,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+            need_vary_cookie = True
         else:
-            settings.SESSION_COOKIE_NAME = 'api_session_id'
-            #logger.debug(f'Detected API session, using session cookie {settings.SESSION_COOKIE_NAME}')
-        response = self.get_response(request)
+            need_vary_cookie = accessed
+            if (modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty:
+                if request.session.get_expire_at_browser_close():
+                    max_age = None
+                    expires = None
+                else:
+                    max_age = request.session.get_expiry_age()
+                    expires = http_date(time.time() + max_age)
+                # Skip session save for 5xx responses
+                if response.status_code < 500:
+                    try:
+                        request.session.save()
+                    except UpdateError:
+                        raise SessionInterrupted(
+                            "The request's session was deleted before the "
+                            "request completed. The user may have logged "
+                            "out in a concurrent request, for example."
+                        )
+                    response.set_cookie(
+                        cookie_name,
+                        request.session.session_key,
+                        max_age=max_age,
+                        expires=expires,
+                        domain=settings.SESSION_COOKIE_DOMAIN,
+                        path=settings.SESSION_COOKIE_PATH,
+                        secure=settings.SESSION_COOKIE_SECURE or None,
+                        httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+                        samesite=settings.SESSION_COOKIE_SAMESITE,
+                    )
+                    need_vary_cookie = True
+        if need_vary_cookie:
+            patch_vary_headers(response, ('Cookie',))
         return response
 
 
@@ -244,8 +467,18 @@ class PatchMorselMiddleware:
         return response
 
 class QueryLoggingMiddleware:
+    """
+    Logs the number of queries and every query slower than
+    SLOW_QUERY['threshold_ms'] (default 10). With SLOW_QUERY['explain'] on,
+    slow SELECTs are handed to the background explainer in
+    `djultra.services.query_plans`; the plans show up in the admin at
+    /admin/djultra/slow-queries/.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
+        config = getattr(settings, 'SLOW_QUERY', {})
+        self.threshold_ms = config.get('threshold_ms', 10)
+        self.explain = config.get('explain', True)
 
     def __call__(self, request):
         response = self.get_response(request)
@@ -253,51 +486,82 @@ class QueryLoggingMiddleware:
         total_queries = len(connection.queries)
         total_time = 0
 
-        # Log queries that took longer than 10 ms
+        # Log queries that took longer than the threshold
         for query in connection.queries:
             query_time = float(query['time']) * 1000  # Convert to milliseconds
             total_time += query_time
-            if query_time > 10:
+            if query_time > self.threshold_ms:
                 logger.warn(f"Slow Query ({query_time:.2f} ms): {query['sql'][:1000]}")
 
-                # Generate the EXPLAIN ANALYZE query
-                #explain_analyze_query = f"EXPLAIN ANALYZE {query['sql']}"
-                #print(f"EXPLAIN ANALYZE query:\n{explain_analyze_query}")
-
+                if self.explain:
+                    # EXPLAIN runs on a background thread, never on the request
+                    services.query_plans.capture(query['sql'], query_time, using=connection.alias)
 
             else:
                 #logger.debug(f"Query ({query_time:.2f} ms): {query['sql']}")
                 pass
 
-            # Generate the EXPLAIN ANALYZE query
-            #explain_analyze_query = f"EXPLAIN ANALYZE {query['sql']}"
-            #print(f"EXPLAIN ANALYZE query:\n{explain_analyze_query}")
-
         logger.info(f"Total number of queries: {total_queries}, total query time: {total_time}")
 
         return response
 
-class ArtificialDelayMiddleware:
+class FaultInjectionMiddleware:
     """
-    Middleware to delay requests to specific paths by a configurable amount of time.
+    Injects latency, errors and slow queries according to the rules in
+    settings.FAULT_INJECTION (see djultra.services.fault_injection for the
+    rule format). Rules can be switched on and off at runtime with
+    `manage.py fault_injection`. Not loaded at all when no rules are configured.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
-        # Load configurations from settings
-        self.delay_config = getattr(settings, 'ARTIFICIAL_DELAY', {})
+        self.injector = self.get_injector()
+        if not self.injector.rules:
+            raise MiddlewareNotUsed
+
+    def get_injector(self):
+        return services.fault_injection.FaultInjector.from_settings()
 
     def __call__(self, request: HttpRequest):
-        # Extract path and delay time from settings
-        delay_path = self.delay_config.get('path', None)
-        delay_time = self.delay_config.get('delay', 0)
+        rules = self.injector.active_rules(request)
+        if not rules:
+            return self.get_response(request)
+
+        for rule in rules:
+            if rule.latency:
+                delay = rule.latency.sample(self.injector.rng)
+                logger.warning('Delaying request rule="%s" path="%s" time=%.3fs', rule.name, request.path, delay)
+                time.sleep(delay)
+
+        for rule in rules:
+            status = rule.sample_error(self.injector.rng)
+            if status:
+                logger.warning('Injecting error rule="%s" path="%s" status=%s', rule.name, request.path, status)
+                return HttpResponse(f'Injected fault: {rule.name}', status=status, content_type='text/plain')
+
+        query_rules = [rule for rule in rules if rule.queries]
+        if not query_rules:
+            return self.get_response(request)
+
+        wrapper = self.injector.query_wrapper(query_rules)
+        with ExitStack() as stack:
+            for db in connections.all():
+                stack.enter_context(db.execute_wrapper(wrapper))
+            return self.get_response(request)
+
+class ArtificialDelayMiddleware(FaultInjectionMiddleware):
+    """
+    Middleware to delay requests to specific paths by a configurable amount of time.
+    Kept for settings.ARTIFICIAL_DELAY = {'path': ..., 'delay': ...}; new setups
+    should use FaultInjectionMiddleware.
+    """
 
+    def get_injector(self):
+        # Load configurations from settings
+        delay_config = getattr(settings, 'ARTIFICIAL_DELAY', {})
+        delay_path = delay_config.get('path', None)
+        delay_time = delay_config.get('delay', 0)
+        rules = []
         if delay_path and delay_time > 0:
-            # Check if the request path matches the configured path
-            if request.path.startswith(delay_path):
-                # Introduce artificial delay
-                logger.warn(f'Delaying requests path="{delay_path}" time={delay_time}s')
-                time.sleep(delay_time)
-
-        response = self.get_response(request)
-        return response
+            rules.append({'name': 'artificial-delay', 'path': re.escape(delay_path), 'latency': delay_time})
+        return services.fault_injection.FaultInjector(rules)
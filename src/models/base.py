@@ -1,6 +1,8 @@
 from itertools import chain
 
 from django.db import models
+from django.db.models.fields.json import KeyTransform
+from django.db.models.query import ModelIterable
 from django.urls import reverse
 from django.utils.html import escape, format_html
 
@@ -38,7 +40,76 @@ def admin_action(description=None):
 #         if save:
 #             self.save()
 
+class JSONOnlyIterable(ModelIterable):
+    """Yields instances with their json_only() fields built from the extracted paths."""
+
+    def __iter__(self):
+        from djultra.fields import DotDict
+
+        projections = self.queryset._json_only
+        for obj in super().__iter__():
+            state = obj.__dict__
+            # Field name -> the partial document it holds, see Base.save()
+            obj._json_projected = {}
+            for field_name, paths in projections.items():
+                document = {}
+                for index, path in enumerate(paths):
+                    value = state.pop(f'_json_only_{field_name}_{index}')
+                    # Missing keys and JSON nulls both come back as NULL
+                    if value is None:
+                        continue
+                    *parents, key = path.split('.')
+                    node = document
+                    for parent in parents:
+                        node = node.setdefault(parent, {})
+                    node[key] = value
+                attname = obj._meta.get_field(field_name).attname
+                state[attname] = obj._json_projected[field_name] = DotDict(document)
+            yield obj
+
+
 class BaseQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._json_only = {}
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._json_only = {name: list(paths) for name, paths in self._json_only.items()}
+        return clone
+
+    def json_only(self, field_name, paths):
+        """
+        Loads only `paths` ("theme", "layout.columns") of the JSONField
+        `field_name`: the database extracts them (-> and #> on PostgreSQL,
+        JSON_EXTRACT on SQLite) and the field holds a DotDict of just those
+        keys. Base.save() doesn't write the partial document back, unless
+        the field was assigned another value; refresh_from_db() loads it in
+        full.
+        """
+        clone = self._chain()
+        field_paths = clone._json_only.setdefault(field_name, [])
+        annotations = {}
+        for path in [paths] if isinstance(paths, str) else paths:
+            expression = field_name
+            for key in path.split('.'):
+                expression = KeyTransform(key, expression)
+            annotations[f'_json_only_{field_name}_{len(field_paths)}'] = expression
+            field_paths.append(path)
+        clone = clone.defer(field_name).annotate(**annotations)
+        if clone._iterable_class is ModelIterable:
+            clone._iterable_class = JSONOnlyIterable
+        return clone
+
+    def _values(self, *fields, **expressions):
+        clone = super()._values(*fields, **expressions)
+        if clone._json_only:
+            # The extracted paths are no columns of their own in values()
+            clone.query.set_annotation_mask(
+                [name for name in clone.query.annotation_select if not name.startswith('_json_only_')])
+            clone._json_only = {}
+        return clone
+
     def delete(self, *args, **kwargs):
         """Additionally calls the delete() method on reach record before actually deleting"""
         for instance in self:
@@ -57,6 +128,9 @@ class BaseManager(models.Manager):
     def get_queryset(self):
         return BaseQuerySet(self.model, using=self._db)
 
+    def json_only(self, field_name, paths):
+        return self.get_queryset().json_only(field_name, paths)
+
 class Base(models.Model):
     class Admin:
         pass
@@ -66,6 +140,25 @@ class Base(models.Model):
 
     objects = BaseManager()
 
+    def save(self, *args, **kwargs):
+        # Fields loaded through json_only() hold partial documents; like
+        # deferred fields, save() leaves them alone while they still hold one
+        projected = getattr(self, '_json_projected', None)
+        if projected and kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not args:
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname in self.__dict__
+                and self.__dict__[field.attname] is not projected.get(field.name, self)
+            ]
+        return super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        projected = getattr(self, '_json_projected', None)
+        if projected:
+            for field_name in list(projected) if fields is None else fields:
+                projected.pop(field_name, None)
+
     def get_admin_url(self):
         """Return the admin change URL for the model instance."""
         opts = self._meta
@@ -1,12 +1,19 @@
+import copy
 import json
 import logging
+import threading
+from collections import OrderedDict, UserDict, UserList
 from datetime import date, datetime
 from decimal import Decimal
+from functools import lru_cache
 
+from django.core.exceptions import FieldDoesNotExist
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.signing import JSONSerializer
-from django.db.models import Model
+from django.db.models import Model, Prefetch
+from django.db.models.constants import LOOKUP_SEP
 from rest_framework import pagination, serializers
+from rest_framework.utils.serializer_helpers import BindingDict
 
 #from django_countries.fields import Country
 
@@ -17,11 +24,15 @@ class CustomJSONEncoder(DjangoJSONEncoder):
     """Custom JSON Encoder to handle additional types, including Django models."""
 
     def default(self, obj):
-        logger.debug('CUSTOM JSON: ', type(obj), obj)
+        # Called for every non-native value; skip even the call when DEBUG is off
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('CUSTOM JSON: ', type(obj), obj)
         if isinstance(obj, (date, datetime)):
             return obj.isoformat()  # Convert date/datetime to ISO 8601 format
         if isinstance(obj, Decimal):
             return format(obj, 'f').rstrip('0').rstrip('.')
+        if isinstance(obj, (UserDict, UserList)):
+            return obj.data  # DotView and ListView wrap plain JSON data
         if isinstance(obj, Model):
             if hasattr(obj, "to_json") and callable(obj.to_json):
                 return obj.to_json()  # Call the model's `to_json` method
@@ -47,9 +58,11 @@ class CustomJSONSerializer(JSONSerializer):
         # Use standard json.loads, with optional custom decoding if necessary
         return json.loads(data)
 
+@lru_cache(maxsize=None)
 def create_custom_subclass(base_class, model, name_suffix):
     """
     Dynamically creates a subclass of base_class with a unique name and correct Meta class.
+    Memoized, so every relation has one class per process.
     """
     Meta = type('Meta', (), {
         'model': model,
@@ -94,7 +107,7 @@ class ModelMethodField(serializers.Field):
                 if obj is None:
                     break
             except ValueError:
-                logger.warn(f'Cannot fetch "{part}" from "{field_name}"')
+                logger.warning('Cannot fetch "%s" from "%s"', part, field_name)
                 break
         #logger.debug('RESULT: ', obj)
         return obj
@@ -110,7 +123,8 @@ class ModelMethodField(serializers.Field):
             if hasattr(instance, potential_method_name):
                 self.method_name = potential_method_name
             else:
-                logger.warn(f'Cannot find attribute: name={self.method_name} instance={type(instance)}')
+                # %-style keeps one message template per call site for DeduplicateFilter
+                logger.warning('Cannot find attribute: name=%s instance=%s', self.method_name, type(instance))
 
         # Retrieve the method on the model instance
         method = getattr(instance, self.method_name, None)
@@ -153,7 +167,95 @@ class ModelMethodField(serializers.Field):
         # Return as-is for unsupported types
         return value
 
+def freeze(value):
+    """A hashable equivalent of serializer parameters (dicts, lists, sets)."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(item) for item in value)
+    return value
+
+
+class PlanCache(OrderedDict):
+    """
+    Plans (fields, querysets) by serializer configuration, least recently
+    used first. Configurations can come from query parameters, so only the
+    most recently used ones are kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def get_or_build(self, key, build, size):
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable configuration, nothing to cache it by
+            return build()
+        with self.lock:
+            plan = self.get(key)
+            if plan is not None:
+                self.move_to_end(key)
+                return plan
+        plan = build()
+        with self.lock:
+            self[key] = plan
+            while len(self) > size:
+                self.popitem(last=False)
+        return plan
+
+
+# Parameters that shape a DynamicFieldsModelSerializer's fields
+CONFIG_PARAMS = ('model', 'fields', 'dynamic', 'exclude', 'relations')
+
+
+def trace_path(model, path, join_last=True):
+    """
+    How a dotted attribute path, as ModelMethodField walks it, reads `model`:
+    (relations, field) with the forward relations it follows, each one join
+    for select_related(), and the only() field it ends on. field is None when
+    the path ends on a related object or leaves the model fields (a method,
+    property or many relation), so which columns it reads is unknown.
+    With `join_last` False, a path ending on a relation reads just its column.
+    """
+    relations = []
+    parts = path.split('.')
+    for position, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return relations, None
+        lookup = LOOKUP_SEP.join([*relations, part])
+        if not field.is_relation:
+            return relations, lookup
+        if field.related_model is None or not (field.many_to_one or field.one_to_one):
+            return relations, None
+        if position == len(parts) - 1 and not join_last and field.concrete:
+            return relations, lookup
+        relations.append(part)
+        model = field.related_model
+    return relations, None
+
+
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer configured per instance (or through the context) with
+    `fields`, `dynamic` (method, property or dotted path fields, see
+    ModelMethodField), `exclude` and `relations`. Each relation is
+    {field name: {'model': ..., 'fields': ..., ...}} and is serialized by a
+    nested serializer with that configuration, with or without dynamic
+    fields next to it. The fields built for a configuration are cached, the
+    least recently used `field_plan_cache_size` of them; see get_field_plan().
+    """
+    # Field and queryset plans by configuration, shared by all instances; see
+    # get_field_plan() and optimize_queryset_for()
+    _field_plans = PlanCache()
+    _queryset_plans = PlanCache()
+    field_plan_cache_size = 256
+
     def __init__(self, *args, **kwargs):
 
         self._late_init = False
@@ -198,42 +300,168 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
             return
         self._late_init = True
 
+        # Copies of the plan's unbound fields, bound to this serializer like
+        # DRF binds its declared fields
+        fields = BindingDict(self)
+        for field_name, field in self.get_field_plan().items():
+            fields[field_name] = copy.deepcopy(field)
+        self.__dict__['fields'] = fields
+
+    def get_field_plan(self):
+        """
+        The unbound fields for this serializer's configuration. Building them
+        runs ModelSerializer's model introspection, so each configuration
+        (class, model, fields, dynamic, exclude, relations; model
+        serializer_defaults included) is built once per process while it is
+        among the `field_plan_cache_size` most recently used; nested relation
+        serializers hit the same cache.
+        """
+        key = (type(self), self.Meta.model, freeze(self._fields), freeze(self._dynamic),
+               freeze(self._exclude), freeze(self._relations))
+        return self._field_plans.get_or_build(key, self.build_field_plan, self.field_plan_cache_size)
+
+    def build_field_plan(self):
+        fields = self.get_fields()
 
         if self._fields == '__all__':
             for field_name in self._exclude:
-                self.fields.pop(field_name, None)
+                fields.pop(field_name, None)
         else:
             allowed = set(self._fields)
             allowed.update(self._dynamic)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
-                self.fields.pop(field_name, None)
+            for field_name in set(fields) - allowed:
+                fields.pop(field_name, None)
 
         for field in self._dynamic:
             # Check if the field is a tuple (field_name, method_name)
-            #logger.warn('DYNAMIC: ', field)
             if isinstance(field, tuple):
                 field_name, method_name = field
             else:
                 field_name = method_name = field
 
             # Assign the custom ModelMethodField with the resolved method name
-            self.fields[field_name] = ModelMethodField(method_name=method_name)
-
-            # Handle related fields by creating a custom subclass for each relation
-            for field_name, relation_info in self._relations.items():
-                RelatedSerializerClass = create_custom_subclass(
-                    base_class=DynamicFieldsModelSerializer,
-                    model=relation_info['model'],
-                    name_suffix=field_name
-                )
-                # Instantiate the serializer with the provided context
-                self.fields[field_name] = RelatedSerializerClass(
-                    many=True,
-                    read_only=True,
-                    context=relation_info
-                )
+            fields[field_name] = ModelMethodField(method_name=method_name)
+
+        # Handle related fields by creating a custom subclass for each relation
+        for field_name, relation_info in self._relations.items():
+            RelatedSerializerClass = create_custom_subclass(
+                base_class=DynamicFieldsModelSerializer,
+                model=relation_info['model'],
+                name_suffix=field_name
+            )
+            # Instantiate the serializer with the provided context
+            fields[field_name] = RelatedSerializerClass(
+                many=True,
+                read_only=True,
+                context=relation_info
+            )
+
+        return fields
+
+    def get_queryset_plan(self, model):
+        """
+        (select_related() lookups, prefetch_related() lookups, only() fields)
+        for serializing `model` instances with this configuration: joins for
+        the forward relations of dotted dynamic fields and sources, for each
+        relation (name, model, its own plan) to prefetch, and the columns the
+        field plan reads. The only() fields are None when some field reads
+        attributes whose columns are unknown (methods, properties, relation
+        methods).
+        """
+        select, prefetch, only, whole = set(), [], set(), set()
+        unknown = False
+
+        for field_name, field in self.get_field_plan().items():
+            if field_name in self._relations:
+                relation_info = self._relations[field_name]
+                try:
+                    relation = model._meta.get_field(field_name)
+                except FieldDoesNotExist:
+                    relation = None
+                if 'method' in relation_info or relation is None or not (relation.many_to_many or relation.one_to_many):
+                    unknown = True
+                    continue
+                related_model = relation.related_model
+                related_select, related_prefetch, related_only = field.child.get_queryset_plan(related_model)
+                if related_only is not None and relation.one_to_many:
+                    # Prefetching matches the rows to their parent by the foreign key
+                    if relation.auto_created:
+                        related_only = related_only | {relation.remote_field.name}
+                    else:
+                        related_only = None
+                prefetch.append((field_name, related_model, (related_select, related_prefetch, related_only)))
+                continue
 
+            if isinstance(field, ModelMethodField):
+                path, join_last = field.method_name or field_name, True
+            else:
+                path, join_last = field.source or field_name, False
+                if path == '*':
+                    unknown = True
+                    continue
+                if isinstance(field, serializers.ManyRelatedField) and '.' not in path:
+                    # Primary keys of a many relation, one query for all rows
+                    prefetch.append(path)
+                    continue
+
+            relations, lookup = trace_path(model, path, join_last)
+            for position in range(1, len(relations) + 1):
+                only.add(LOOKUP_SEP.join(relations[:position]))
+            if relations:
+                select.add(LOOKUP_SEP.join(relations))
+            if lookup is not None:
+                only.add(lookup)
+            elif relations:
+                whole.add(LOOKUP_SEP.join(relations))
+            else:
+                unknown = True
+
+        if unknown:
+            only = None
+        else:
+            # A related object used as a whole keeps all its columns
+            only = {name for name in only if not any(name.startswith(prefix + LOOKUP_SEP) for prefix in whole)}
+        return select, prefetch, only
+
+    @staticmethod
+    def apply_queryset_plan(queryset, select, prefetch, only):
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            # Fresh Prefetch objects every time, prefetching nested lookups
+            # modifies them
+            lookups = []
+            for lookup in prefetch:
+                if not isinstance(lookup, str):
+                    field_name, related_model, plan = lookup
+                    related = DynamicFieldsModelSerializer.apply_queryset_plan(related_model._default_manager.all(), *plan)
+                    lookup = Prefetch(field_name, queryset=related)
+                lookups.append(lookup)
+            queryset = queryset.prefetch_related(*lookups)
+        if only is not None:
+            queryset = queryset.only(*sorted(only))
+        return queryset
+
+    def optimize_queryset(self, queryset):
+        """
+        `queryset` loading what this serializer reads in a fixed number of
+        queries, whatever the number of rows; see get_queryset_plan().
+        """
+        return self.apply_queryset_plan(queryset, *self.get_queryset_plan(queryset.model))
+
+    @classmethod
+    def optimize_queryset_for(cls, queryset, context):
+        """
+        optimize_queryset() for the serializer `context` configures, as DRF
+        views pass it (see djultra.views.OptimizedQuerySetMixin). The plan is
+        cached by class, model and configuration, so once it is, no
+        serializer is built.
+        """
+        model = queryset.model
+        key = (cls, model, freeze({name: context.get(name) for name in CONFIG_PARAMS}))
+        plan = cls._queryset_plans.get_or_build(
+            key, lambda: cls(context=context).get_queryset_plan(model), cls.field_plan_cache_size)
+        return cls.apply_queryset_plan(queryset, *plan)
 
     def to_representation(self, instance):
 
@@ -265,7 +493,7 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
                 #logger.warn('CALLABLE: ', field_name, method_name)
             else:
                 #logger.warn('NOT CALLABLE: ', field_name, method_name)
-                logger.warn(f'Serializer method not callable: field={field_name} method={method_name} instance={instance}')
+                logger.warning('Serializer method not callable: field=%s method=%s instance=%s', field_name, method_name, instance)
 
 
         return {key.replace('.', '_'): value for key, value in rep.items()}
@@ -1 +1,2 @@
 from .email import *
+from . import fault_injection, importer, query_plans
@@ -8,18 +8,22 @@ from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django_tasks import task
 
+from djultra import tracing
+
 logger = logging.getLogger(__name__)
 
 @task()
-def send_email_task(subject, html_content, plain_content, recipient_list, from_email):
+def send_email_task(subject, html_content, plain_content, recipient_list, from_email, traceparent=None):
     """Task that uses the service's internal sending method"""
-    Email.send_email(
-        subject=subject,
-        html_content=html_content,
-        plain_content=plain_content,
-        recipient_list=recipient_list,
-        from_email=from_email
-    )
+    # `traceparent` links the delivery to the span that enqueued it
+    with tracing.start_span('send_email_task', traceparent, kind=tracing.KIND_CONSUMER):
+        Email.send_email(
+            subject=subject,
+            html_content=html_content,
+            plain_content=plain_content,
+            recipient_list=recipient_list,
+            from_email=from_email
+        )
 
 class Email:
     @classmethod
@@ -33,13 +37,15 @@ class Email:
 
         if async_mode:
             # Enqueue task with render results in async mode
-            send_email_task.enqueue(
-                subject=subject,
-                html_content=html_content,
-                plain_content=plain_content,
-                recipient_list=recipient_list,
-                from_email=from_email
-            )
+            with tracing.start_span('enqueue send_email_task', kind=tracing.KIND_PRODUCER):
+                send_email_task.enqueue(
+                    subject=subject,
+                    html_content=html_content,
+                    plain_content=plain_content,
+                    recipient_list=recipient_list,
+                    from_email=from_email,
+                    traceparent=tracing.current_traceparent(),
+                )
         else:
             # Send directly
             cls.send_email(subject, plain_content, from_email, recipient_list, html_message=html_content)
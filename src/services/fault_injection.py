@@ -0,0 +1,152 @@
+# djultra/services/fault_injection.py
+import bisect
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'djultra:fault_injection:'
+
+
+class Latency:
+    """
+    Samples a delay in seconds from a spec:
+
+      0.5                                         fixed
+      {'fixed': 0.5}                              fixed
+      {'uniform': [0.1, 0.3]}                     uniform between both bounds
+      {'percentiles': {50: 0.05, 99: 2.0}}        piecewise linear between the
+                                                  given percentiles (long tail)
+    """
+
+    kinds = ('fixed', 'uniform', 'percentiles')
+
+    def __init__(self, spec):
+        if isinstance(spec, (int, float)):
+            spec = {'fixed': spec}
+        # A bad setting fails when the rules load, not on every request
+        if not isinstance(spec, dict) or len(spec) != 1 or next(iter(spec)) not in self.kinds:
+            raise ValueError(f'Unknown latency spec: {spec}')
+        if 'uniform' in spec and len(spec['uniform']) != 2:
+            raise ValueError(f'Latency uniform needs [low, high]: {spec}')
+        self.spec = spec
+        if 'percentiles' in spec:
+            points = sorted((float(p), float(v)) for p, v in spec['percentiles'].items())
+            if points[0][0] > 0:
+                points.insert(0, (0.0, 0.0))
+            if points[-1][0] < 100:
+                points.append((100.0, points[-1][1]))
+            self.percentiles = [p for p, _ in points]
+            self.values = [v for _, v in points]
+
+    def sample(self, rng):
+        if 'fixed' in self.spec:
+            return self.spec['fixed']
+        if 'uniform' in self.spec:
+            return rng.uniform(*self.spec['uniform'])
+        if 'percentiles' in self.spec:
+            position = rng.uniform(0, 100)
+            index = max(1, bisect.bisect_left(self.percentiles, position))
+            low_p, high_p = self.percentiles[index - 1], self.percentiles[index]
+            low_v, high_v = self.values[index - 1], self.values[index]
+            if high_p == low_p:
+                return high_v
+            return low_v + (high_v - low_v) * (position - low_p) / (high_p - low_p)
+        raise ValueError(f'Unknown latency spec: {self.spec}')
+
+
+class Rule:
+    """
+    One injection rule. A request matches when its path matches the `path`
+    regex and, if `methods` is given, its method is listed. A matching request
+    is delayed by `latency`, fails with `error['status']` with probability
+    `error['rate']`, and every SQL statement matching `queries` is delayed by
+    `query_latency`.
+    """
+
+    def __init__(self, name, path=r'^/', methods=None, latency=None, error=None,
+                 queries=None, query_latency=None, enabled=True):
+        self.name = name
+        self.path = re.compile(path)
+        self.methods = {method.upper() for method in methods} if methods else None
+        self.latency = Latency(latency) if latency is not None else None
+        self.error = error
+        self.queries = re.compile(queries, re.IGNORECASE) if queries else None
+        self.query_latency = Latency(query_latency) if query_latency is not None else None
+        self.enabled = enabled
+
+    def matches(self, request):
+        if self.methods and request.method not in self.methods:
+            return False
+        return bool(self.path.match(request.path))
+
+    def sample_error(self, rng):
+        if self.error and rng.random() < self.error.get('rate', 1.0):
+            return self.error.get('status', 500)
+        return None
+
+
+class FaultInjector:
+    """
+    Rule engine behind FaultInjectionMiddleware. Rules come from settings;
+    whether a rule is active can be switched at runtime through the cache
+    (see the `fault_injection` management command), so with a shared cache
+    backend all processes follow the switch within `refresh_seconds`.
+    """
+
+    def __init__(self, rules, seed=None, refresh_seconds=1):
+        self.rules = [rule if isinstance(rule, Rule) else Rule(**rule) for rule in rules]
+        self.rng = random.Random(seed)
+        self.refresh_seconds = refresh_seconds
+        self._enabled = {}
+        self._refreshed_at = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'FAULT_INJECTION', {})
+        return cls(config.get('rules', []), seed=config.get('seed'), refresh_seconds=config.get('refresh_seconds', 1))
+
+    def get_rule(self, name):
+        for rule in self.rules:
+            if rule.name == name:
+                return rule
+        raise KeyError(name)
+
+    def is_enabled(self, rule):
+        now = time.monotonic()
+        if self._refreshed_at is None or now - self._refreshed_at > self.refresh_seconds:
+            keys = {CACHE_PREFIX + rule.name: rule.name for rule in self.rules}
+            overrides = cache.get_many(list(keys))
+            self._enabled = {keys[key]: value for key, value in overrides.items()}
+            self._refreshed_at = now
+        return self._enabled.get(rule.name, rule.enabled)
+
+    def set_enabled(self, name, enabled):
+        self.get_rule(name)
+        cache.set(CACHE_PREFIX + name, enabled, timeout=None)
+        self._refreshed_at = None
+
+    def reset(self, name=None):
+        names = [name] if name else [rule.name for rule in self.rules]
+        cache.delete_many([CACHE_PREFIX + name for name in names])
+        self._refreshed_at = None
+
+    def active_rules(self, request):
+        return [rule for rule in self.rules if rule.matches(request) and self.is_enabled(rule)]
+
+    def query_wrapper(self, rules):
+        """Execute wrapper delaying the statements matched by `rules`."""
+        def wrapper(execute, sql, params, many, context):
+            for rule in rules:
+                if rule.query_latency and rule.queries.search(sql):
+                    delay = rule.query_latency.sample(self.rng)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f'Delaying query rule="{rule.name}" time={delay:.3f}s')
+                    time.sleep(delay)
+            return execute(sql, params, many, context)
+        return wrapper
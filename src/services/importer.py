@@ -0,0 +1,219 @@
+# djultra/services/importer.py
+#
+# Streams CSV and XLSX files into a model in chunks: each chunk is cleaned
+# column-wise with fields.clean_rows() and written with bulk_create(), or
+# COPY on PostgreSQL. Memory stays bounded by the chunk size, whatever the
+# file size. Rejected rows go to a CSV side file with their errors.
+import csv
+import itertools
+import logging
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, time as datetime_time
+from pathlib import Path
+
+from django.db import connections, router, transaction
+
+from djultra import fields
+
+logger = logging.getLogger(__name__)
+
+ImportStats = namedtuple('ImportStats', 'rows imported rejected seconds')
+
+_HEADER_PATTERN = re.compile(r'[^a-z0-9]+')
+
+SNIFF_DELIMITERS = ',;\t|'
+
+
+def fold_header(value):
+    """Header or field name as compared: "Date of Birth" and "date_of_birth" are the same."""
+    return _HEADER_PATTERN.sub('_', str(value or '').lower()).strip('_')
+
+
+def read_csv(path, delimiter=None, encoding='utf-8-sig'):
+    """
+    (header, rows) of a CSV file; rows is a lazy iterator of lists. Without
+    a `delimiter`, it is sniffed from the start of the file.
+    """
+    f = open(path, newline='', encoding=encoding)
+    if delimiter is None:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=SNIFF_DELIMITERS).delimiter
+        except csv.Error:
+            delimiter = ','
+    reader = csv.reader(f, delimiter=delimiter)
+    header = next(reader, [])
+
+    def rows():
+        with f:
+            yield
+            yield from reader
+
+    return header, primed(rows())
+
+
+def primed(rows):
+    # Started up to its first bare yield, inside the generator's cleanup, so
+    # close() releases the file even when no row was ever read
+    next(rows)
+    return rows
+
+
+def excel_value(value):
+    # Excel has no date type; dates are datetimes at midnight
+    if isinstance(value, datetime) and value.time() == datetime_time():
+        return value.date()
+    return value
+
+
+def read_xlsx(path, sheet=None):
+    """(header, rows) of the first (or the named) sheet of an XLSX file."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError('Reading XLSX files needs openpyxl (pip install openpyxl)')
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    if sheet and sheet not in workbook.sheetnames:
+        workbook.close()
+        raise ValueError(f"No sheet '{sheet}' in {path}, it has: {', '.join(workbook.sheetnames)}")
+    worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+    reader = worksheet.iter_rows(values_only=True)
+    header = [str(value) if value is not None else '' for value in next(reader, ())]
+
+    def rows():
+        try:
+            yield
+            for row in reader:
+                yield [excel_value(value) for value in row]
+        finally:
+            workbook.close()
+
+    return header, primed(rows())
+
+
+def read_rows(path, **kwargs):
+    if Path(path).suffix.lower() in ('.xlsx', '.xlsm'):
+        return read_xlsx(path, **kwargs)
+    return read_csv(path, **kwargs)
+
+
+def map_columns(model, header, columns=None):
+    """
+    {column position: field name}. `columns` maps headers to field names;
+    other headers match a field by name or verbose name. Headers without a
+    field are skipped.
+    """
+    columns = {fold_header(key): value for key, value in (columns or {}).items()}
+    names = {}
+    for field in model._meta.concrete_fields:
+        if not field.auto_created:
+            names.setdefault(fold_header(field.name), field.name)
+            names.setdefault(fold_header(field.verbose_name), field.name)
+    mapping = {}
+    for position, title in enumerate(header):
+        key = fold_header(title)
+        name = columns.get(key) or names.get(key)
+        if name:
+            model._meta.get_field(name)
+            mapping[position] = name
+    return mapping
+
+
+def copy_rows(model, instances, using):
+    """Writes `instances` with COPY FROM STDIN; needs PostgreSQL with psycopg 3."""
+    connection = connections[using]
+    opts = model._meta
+    # What bulk_create() would insert: everything but generated and auto primary keys
+    copy_fields = [field for field in opts.concrete_fields
+                   if not field.generated and not (field.primary_key and field.auto_created)]
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(opts.db_table)} ({", ".join(quote(field.column) for field in copy_fields)}) FROM STDIN'
+    with connection.cursor() as cursor, cursor.cursor.copy(sql) as copy:
+        for obj in instances:
+            copy.write_row([field.get_db_prep_save(field.pre_save(obj, True), connection) for field in copy_fields])
+
+
+def can_copy(using):
+    if connections[using].vendor != 'postgresql':
+        return False
+    # Only psycopg 3 cursors have copy(); psycopg2 gets bulk_create()
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+def import_rows(model, path, columns=None, chunk_size=10000, processes=None, rejects=None,
+                use_copy=None, using=None, progress=None, **read_kwargs):
+    """
+    Imports a CSV or XLSX file into `model` chunk by chunk; each chunk is one
+    transaction. Rows with any rejected cell are skipped and, with `rejects`,
+    written to that CSV file with their row number and errors. COPY is used on
+    PostgreSQL unless `use_copy` is False. `progress` is called with the
+    ImportStats so far after every chunk. Returns the final ImportStats.
+    """
+    using = using or router.db_for_write(model)
+    use_copy = can_copy(using) if use_copy is None else use_copy
+    header, rows = read_rows(path, **read_kwargs)
+    rejects_file = None
+    try:
+        mapping = map_columns(model, header, columns)
+        if not mapping:
+            raise ValueError(f'No column of {path} matches a field of {model.__name__}')
+        skipped = [title for position, title in enumerate(header) if position not in mapping]
+        if skipped:
+            logger.info('Importing %s: skipping columns without a field: %s', path, ', '.join(skipped))
+
+        positions = list(mapping)
+        names = list(mapping.values())
+        # Number columns read in one locale for the whole file, decided by
+        # the first chunk with a value that can only be read one way
+        undecided = {name for name in names if hasattr(model._meta.get_field(name), 'detect_locale')}
+        locales = {}
+        started = time.monotonic()
+        total = imported = rejected = 0
+        rejects_file = open(rejects, 'w', newline='', encoding='utf-8') if rejects else None
+        rejects_writer = csv.writer(rejects_file) if rejects_file else None
+        if rejects_writer:
+            rejects_writer.writerow(['row', *header, 'errors'])
+
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            values = [[row[position] if position < len(row) else None for position in positions] for row in chunk]
+            for name in list(undecided):
+                column = names.index(name)
+                locale = model._meta.get_field(name).detect_locale([row[column] for row in values])
+                if locale is not None:
+                    locales[name] = locale
+                    undecided.discard(name)
+            cleaned, errors = fields.clean_rows(model, values, fields=names, processes=processes, locales=locales)
+            instances = fields.build_instances(model, cleaned, errors)
+            with transaction.atomic(using=using):
+                if use_copy:
+                    copy_rows(model, instances, using)
+                else:
+                    model._default_manager.using(using).bulk_create(instances)
+
+            if rejects_writer and errors:
+                messages = {}
+                for error in errors:
+                    messages.setdefault(error.row, []).append(f'{error.field}: {error.message}')
+                for index, row_messages in messages.items():
+                    # Row 1 is the header
+                    rejects_writer.writerow([total + index + 2, *chunk[index], '; '.join(row_messages)])
+
+            total += len(chunk)
+            imported += len(instances)
+            rejected += len(chunk) - len(instances)
+            if progress:
+                progress(ImportStats(total, imported, rejected, time.monotonic() - started))
+    finally:
+        if rejects_file:
+            rejects_file.close()
+        rows.close()
+
+    stats = ImportStats(total, imported, rejected, time.monotonic() - started)
+    logger.info('Imported %s into %s: rows=%s imported=%s rejected=%s time=%.1fs',
+                path, model.__name__, total, imported, rejected, stats.seconds)
+    return stats
@@ -0,0 +1,227 @@
+# djultra/services/query_plans.py
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# String literals, numbers and the IN (...) lists they form; replaced so that
+# the same statement with different parameters shares one fingerprint
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Row-locking clauses turn a SELECT into a write for our purposes
+_LOCKING_PATTERN = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE)\b', re.IGNORECASE)
+
+
+def normalize(sql):
+    """Replace literals in `sql` with placeholders and collapse whitespace."""
+    sql = _LITERAL_PATTERN.sub('?', sql)
+    sql = _IN_LIST_PATTERN.sub('(?)', sql)
+    return _WHITESPACE_PATTERN.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+def is_read_only(sql):
+    """
+    Only plain single SELECT statements are ever explained. With ANALYZE the
+    statement really runs, so anything that could write or lock is refused.
+    """
+    sql = sql.strip().rstrip(';')
+    if ';' in sql or sql[:6].upper() != 'SELECT':
+        return False
+    return not _LOCKING_PATTERN.search(sql)
+
+
+class QueryPlanEntry:
+    __slots__ = ('fingerprint', 'sql', 'last_sql', 'count', 'total_ms', 'max_ms',
+                 'last_seen', 'plan', 'plan_at', 'plan_error')
+
+    def __init__(self, fingerprint, sql):
+        self.fingerprint = fingerprint
+        self.sql = normalize(sql)
+        self.last_sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = None
+        self.plan = None
+        self.plan_at = None
+        self.plan_error = None
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class QueryPlanStore:
+    """
+    Bounded in-process store of slow statements, deduplicated by fingerprint.
+    When full, the entry with the least accumulated time makes room, so the
+    worst offenders survive a flood of one-off queries.
+    """
+
+    def __init__(self, max_entries=200):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, sql, duration_ms):
+        """Account one execution of `sql` and return its fingerprint."""
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    cheapest = min(self._entries.values(), key=lambda e: e.total_ms)
+                    del self._entries[cheapest.fingerprint]
+                entry = self._entries[key] = QueryPlanEntry(key, sql)
+            entry.last_sql = sql
+            entry.count += 1
+            entry.total_ms += duration_ms
+            entry.max_ms = max(entry.max_ms, duration_ms)
+            entry.last_seen = time.time()
+        return key
+
+    def needs_plan(self, key, refresh_seconds):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        return entry.plan_at is None or time.time() - entry.plan_at > refresh_seconds
+
+    def set_plan(self, key, plan=None, error=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.plan = plan
+                entry.plan_error = error
+                entry.plan_at = time.time()
+
+    def worst(self, limit=None):
+        """Entries ordered by accumulated time, worst first."""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e.total_ms, reverse=True)
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ExplainWorker:
+    """
+    Runs EXPLAIN for slow statements on a background thread, so the request
+    that hit the slow query never waits for the plan. Submissions beyond
+    `queue_size` are dropped rather than blocking the caller.
+    """
+
+    def __init__(self, store, analyze=False, queue_size=100, refresh_seconds=300):
+        self.store = store
+        self.analyze = analyze
+        self.refresh_seconds = refresh_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, sql, duration_ms, using='default'):
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait((sql, duration_ms, using))
+            return True
+        except queue.Full:
+            return False
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so a prefork worker starts its own
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='djultra-explain', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            sql, duration_ms, using = self.queue.get()
+            try:
+                self.process(sql, duration_ms, using)
+            except Exception:
+                logger.exception('Capturing query plan failed')
+            finally:
+                connections[using].close_if_unusable_or_obsolete()
+                self.queue.task_done()
+
+    def process(self, sql, duration_ms, using='default'):
+        key = self.store.record(sql, duration_ms)
+        if not is_read_only(sql) or not self.store.needs_plan(key, self.refresh_seconds):
+            return
+        try:
+            self.store.set_plan(key, plan=self.explain(sql, using))
+        except Exception as e:
+            logger.debug(f'EXPLAIN failed for fingerprint={key}: {e}')
+            self.store.set_plan(key, error=str(e))
+
+    def explain_prefix(self, connection):
+        if self.analyze:
+            try:
+                return connection.ops.explain_query_prefix(analyze=True)
+            except ValueError:
+                # Backend has no ANALYZE option (e.g. SQLite), plain EXPLAIN it is
+                pass
+        return connection.ops.explain_query_prefix()
+
+    def explain(self, sql, using='default'):
+        connection = connections[using]
+        prefix = self.explain_prefix(connection)
+        # ANALYZE executes the statement; the rollback keeps even a read-only
+        # statement from leaving anything behind
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}')
+                rows = cursor.fetchall()
+            transaction.set_rollback(True, using=using)
+        return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+store = QueryPlanStore()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_config():
+    return getattr(settings, 'SLOW_QUERY', {})
+
+
+def get_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                config = get_config()
+                store.max_entries = config.get('max_entries', store.max_entries)
+                _worker = ExplainWorker(
+                    store,
+                    analyze=config.get('analyze', False),
+                    queue_size=config.get('queue_size', 100),
+                    refresh_seconds=config.get('refresh_seconds', 300),
+                )
+    return _worker
+
+
+def capture(sql, duration_ms, using='default'):
+    """Hand a slow statement to the background explainer; never blocks."""
+    return get_worker().submit(sql, duration_ms, using)
@@ -7,6 +7,7 @@
 # production is the special case and overrides via env vars.
 
 import re
+import sys
 
 from django.core.exceptions import ImproperlyConfigured
 
@@ -27,6 +28,31 @@ DEBUG = config('DEBUG', default=True, if_not_in_ns=globals())
 # with DEBUG on, everything logs at DEBUG level regardless
 LOG_LEVEL = config('LOG_LEVEL', default='ERROR', if_not_in_ns=globals())
 
+# Console log output: 'rich' (colored tables for a developer's terminal),
+# 'json' or 'logfmt' (one line per record for log collectors). Defaults to
+# rich only in DEBUG with stdout attached to a terminal
+LOG_FORMAT = config('LOG_FORMAT', default='rich' if DEBUG and sys.stdout.isatty() else 'json', if_not_in_ns=globals())
+
+# Hands console records to a background writer thread through a bounded
+# queue of LOG_QUEUE_SIZE records, so a slow stdout never delays a request.
+# LOG_QUEUE_OVERFLOW: 'drop' discards records while the queue is full,
+# 'block' makes the logging thread wait for room
+LOG_QUEUE = config('LOG_QUEUE', default=False, if_not_in_ns=globals())
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, if_not_in_ns=globals())
+LOG_QUEUE_OVERFLOW = config('LOG_QUEUE_OVERFLOW', default='drop', if_not_in_ns=globals())
+
+# Tail-based logging: records below LOG_LEVEL are held back per request (up
+# to LOG_BUFFER_SIZE) and only written when the request logs an error, ends
+# with a 5xx status or takes LOG_BUFFER_SLOW_MS or longer
+LOG_BUFFER = config('LOG_BUFFER', default=False, if_not_in_ns=globals())
+LOG_BUFFER_SIZE = config('LOG_BUFFER_SIZE', default=1000, if_not_in_ns=globals())
+LOG_BUFFER_SLOW_MS = config('LOG_BUFFER_SLOW_MS', default=1000, if_not_in_ns=globals())
+
+# File spans are appended to (OTLP/JSON lines, see djultra.tracing) for
+# following a request into the tasks and fastmanage commands it causes;
+# empty turns tracing off
+DJU_TRACE_FILE = config('DJU_TRACE_FILE', default='', if_not_in_ns=globals())
+
 # Origin the frontend dev server runs on; feeds CORS, CSRF trust and CSP
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5173', if_not_in_ns=globals())
 
@@ -77,9 +103,20 @@ LOGGING = {
     'root': {
         'handlers': ['console'],
         #'level': 'INFO',
-        'level': 'DEBUG',
+        # Same as the console handler, so disabled levels are already
+        # refused by logger.isEnabledFor() and no records get created;
+        # LOG_BUFFER needs all of them
+        'level': 'DEBUG' if DEBUG or LOG_BUFFER else LOG_LEVEL,
     },
 
+    "filters": {
+        # Collapses floods of the same record (e.g. one warning per row of
+        # a list response) into one record plus a "suppressed N" note
+        "deduplicate": {
+            "()": "djultra.logging.DeduplicateFilter",
+            "window": 10,
+        },
+    },
     "formatters": {
         "rich": {
             "datefmt": "%X",
@@ -90,17 +127,56 @@ LOGGING = {
         "console": {
             "class": "djultra.logging.CustomRichHandler",
             "formatter": "rich",
-            "level": "DEBUG" if DEBUG else LOG_LEVEL,
+            "filters": ["deduplicate"],
+            "level": "DEBUG" if DEBUG or LOG_BUFFER else LOG_LEVEL,
             "rich_tracebacks": True,
             "tracebacks_show_locals": False,
             # Has to be a part of a directory or path name
             "tracebacks_suppress": ['venv', '/usr/lib'],
             #"tracebacks_width": 100,
             "markup": False,
+        } if LOG_FORMAT == 'rich' else {
+            # Same records without Rich: one JSON/logfmt line each
+            "class": "djultra.logging.StructuredHandler",
+            "filters": ["deduplicate"],
+            "level": "DEBUG" if DEBUG or LOG_BUFFER else LOG_LEVEL,
+            "format": LOG_FORMAT,
         }
     },
 }
 
+if LOG_QUEUE:
+    console_handler = LOGGING['handlers']['console']
+    LOGGING['handlers']['console'] = {
+        "class": "djultra.logging.QueuedHandler",
+        "handler": {
+            **{key: value for key, value in console_handler.items() if key != "filters"},
+            # Nested handlers take the formatter itself, not its name
+            **({"formatter": LOGGING['formatters']['rich']} if console_handler.get("formatter") == "rich" else {}),
+        },
+        # Filtering and the level check before the queue keep suppressed
+        # records out of it
+        "filters": console_handler["filters"],
+        "level": console_handler["level"],
+        "maxsize": LOG_QUEUE_SIZE,
+        "overflow": LOG_QUEUE_OVERFLOW,
+    }
+
+if LOG_BUFFER:
+    # Wraps the queue too, if any: buffer -> queue -> console
+    console_handler = LOGGING['handlers']['console']
+    LOGGING['handlers']['console'] = {
+        "class": "djultra.logging.RequestBufferHandler",
+        "handler": {
+            **{key: value for key, value in console_handler.items() if key != "filters"},
+            **({"formatter": LOGGING['formatters']['rich']} if console_handler.get("formatter") == "rich" else {}),
+        },
+        "filters": console_handler["filters"],
+        "threshold": "DEBUG" if DEBUG else LOG_LEVEL,
+        "capacity": LOG_BUFFER_SIZE,
+        "slow_ms": LOG_BUFFER_SLOW_MS,
+    }
+
 
 MIDDLEWARE = [
     # Patches Python's built-in Cookie Morsel to allow
@@ -109,10 +185,17 @@ MIDDLEWARE = [
     'djultra.middleware.PatchMorselMiddleware',
     'djultra.middleware.RequestIDMiddleware',
 
-    # Allows having a Django Admin session in parallel to an API session
-    'djultra.middleware.AdminSessionMiddleware',
+    # Rejects requests that waited too long in the server queue before any
+    # view work is done; only active when LOAD_SHEDDING has rules
+    'djultra.middleware.LoadSheddingMiddleware',
 
-    *MIDDLEWARE,
+    # Allows having a Django Admin session in parallel to an API session;
+    # takes the place of Django's SessionMiddleware in the project's list
+    *[
+        'djultra.middleware.AdminSessionMiddleware'
+        if middleware == 'django.contrib.sessions.middleware.SessionMiddleware' else middleware
+        for middleware in MIDDLEWARE
+    ],
 
     # Self-heals lagging postgres id sequences on duplicate-pkey errors and
     # retries; innermost, so the retried response still passes through the
@@ -124,10 +207,63 @@ MIDDLEWARE = [
     # Logs slow queries and number of queries (so far only usefull in dev env).
     'djultra.middleware.QueryLoggingMiddleware',
 
-    # Test slow API responses
-    #'djultra.middleware.ArtificialDelayMiddleware',
+    # Test slow and failing API responses (rules in FAULT_INJECTION)
+    #'djultra.middleware.FaultInjectionMiddleware',
 ]
 
+# Queue-time load shedding (LoadSheddingMiddleware): the first rule whose path
+# regex matches applies; 'action' is 'reject' (503 + Retry-After, default) or
+# 'degrade' (the given view answers instead). Queue time is measured from
+# HTTP_X_START_TIME as stamped by wsgi.py, from the proxy's X-Start-Time or
+# X-Request-Start header when it sends one.
+#LOAD_SHEDDING = {
+#    'rules': [
+#        {'path': r'^/api/', 'max_queue_seconds': 2},
+#    ],
+#    'exempt': [r'^/admin'],
+#    'retry_after': 5,
+#}
+
+# Vite dev-server proxy for a Django-served SPA in dev (DevProxyMiddleware,
+# not in the default middleware list)
+#DEV_PROXY = {
+#    'url': FRONTEND_URL,
+#    'prefix': '/static/frontend/',
+#    'stream': True,
+#    'pool_size': 20,
+#    'timeout': 10,
+#}
+
+# Latency and fault injection for load tests (FaultInjectionMiddleware).
+# 'latency' and 'query_latency' take seconds, {'uniform': [low, high]} or
+# {'percentiles': {50: 0.05, 99: 2}}; 'error' fails matching requests with the
+# given probability. Toggle rules at runtime with
+# `manage.py fault_injection enable|disable <name>` (needs a shared cache to
+# reach other processes).
+#FAULT_INJECTION = {
+#    'rules': [
+#        {'name': 'slow-api', 'path': r'^/api/', 'methods': ['GET'],
+#         'latency': {'percentiles': {50: 0.05, 95: 0.5, 99: 2}}},
+#        {'name': 'flaky-writes', 'path': r'^/api/', 'methods': ['POST', 'PATCH'],
+#         'error': {'rate': 0.05, 'status': 503}},
+#        {'name': 'slow-sessions', 'queries': r'"django_session"', 'query_latency': 0.2,
+#         'enabled': False},
+#    ],
+#}
+
+# Slow-query logging and background EXPLAIN capture (QueryLoggingMiddleware);
+# captured plans are listed at /admin/djultra/slow-queries/ for superusers.
+# ANALYZE really executes the (SELECT-only) statement, inside a rolled-back
+# transaction.
+#SLOW_QUERY = {
+#    'threshold_ms': 10,
+#    'explain': True,
+#    'analyze': False,
+#    'max_entries': 200,
+#    'queue_size': 100,
+#    'refresh_seconds': 300,
+#}
+
 ##############
 ## REST API ##
 ##############
@@ -1,18 +1,69 @@
 import array
+import copy
+import gzip
+import http.server
 import io
 import http.cookies
 import json
+import logging
+import pickle
 import shlex
+import sys
 import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 from pathlib import Path
 from unittest import TestCase, mock
 
 from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
-from django.test import override_settings
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase as DatabaseTestCase, override_settings
+from django.test.utils import isolate_apps
+from rest_framework import generics, permissions, serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
 
+from . import benchmarks, fields, logging as djultra_logging, serializers as djultra_serializers, services, tracing, views, wsgi
 from .management.commands import fastmanage_daemon
-from .middleware import PatchMorselMiddleware
+from . import middleware
+from .middleware import AdminSessionMiddleware, PatchMorselMiddleware, RequestIDMiddleware
+from .models import Base
+from .serializers import DynamicFieldsModelSerializer, create_custom_subclass
+
+
+def create_test_model(name, base=models.Model, **fields):
+    """Model class outside the app registry; tables come from TemporaryTablesTestCase."""
+    with isolate_apps('djultra'):
+        meta = type('Meta', (), {'app_label': 'djultra'})
+        return type(name, (base,), {'__module__': __name__, 'Meta': meta, **fields})
+
+
+class TemporaryTablesTestCase(DatabaseTestCase):
+    """Creates the tables of `test_models` around the class-level transaction."""
+    test_models = ()
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            for model in cls.test_models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in cls.test_models:
+                editor.delete_model(model)
+
+
+Article = create_test_model('Article', base=Base, title=models.CharField(max_length=100))
 
 
 class RecvmsgConnection:
@@ -70,7 +121,7 @@ class FastmanageDaemonFunctionTests(TestCase):
         with self.assertLogs(fastmanage_daemon.__name__, level="ERROR"):
             self.assertIsNone(self.parse_request(msg, ancillary))
 
-    def run_worker_with_system_exit(self, code):
+    def run_worker_with_system_exit(self, code, env=None):
         calls = []
 
         class ExitManagementUtility:
@@ -92,7 +143,7 @@ class FastmanageDaemonFunctionTests(TestCase):
                                 with mock.patch.dict(fastmanage_daemon.os.environ, {}, clear=False):
                                     object.__new__(fastmanage_daemon.FastmanageDaemon).run_worker(
                                         conn,
-                                        {},
+                                        env or {},
                                         ["manage.py", "fake"],
                                         [101, 102, 103],
                                     )
@@ -188,6 +239,18 @@ class FastmanageDaemonFunctionTests(TestCase):
         close.assert_has_calls([mock.call(101), mock.call(102), mock.call(103)])
         self.assertEqual(calls, [((), {"use_socket": False})])
 
+    def test_run_worker_continues_the_clients_trace(self):
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trace_file = Path(temp_dir) / "spans.jsonl"
+            with override_settings(DJU_TRACE_FILE=str(trace_file)):
+                self.run_worker_with_system_exit(0, env={"TRACEPARENT": traceparent})
+            span = json.loads(trace_file.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+
+        self.assertEqual(span["name"], "manage.py fake")
+        self.assertEqual(span["parentSpanId"], "00f067aa0ba902b7")
+        self.assertEqual(span["status"], {"code": tracing.STATUS_UNSET})
+
 
 class PatchMorselMiddlewareTests(TestCase):
     def test_forces_cookie_settings_without_warning_for_django_defaults(self):
@@ -227,3 +290,1311 @@ class PatchMorselMiddlewareTests(TestCase):
             cookie["csrftoken"] = "token"
 
             self.assertIn("Partitioned", cookie["csrftoken"].OutputString())
+
+
+class QueryPlansTests(DatabaseTestCase):
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            services.query_plans.fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'a'"),
+            services.query_plans.fingerprint("SELECT *  FROM t WHERE id = 42 AND name = 'it''s'"),
+        )
+        self.assertEqual(
+            services.query_plans.normalize("SELECT * FROM t WHERE id IN (1, 2, 3)"),
+            "SELECT * FROM t WHERE id IN (?)",
+        )
+
+    def test_only_plain_selects_are_read_only(self):
+        self.assertTrue(services.query_plans.is_read_only("SELECT 1"))
+        self.assertFalse(services.query_plans.is_read_only("DELETE FROM t"))
+        self.assertFalse(services.query_plans.is_read_only("SELECT * FROM t FOR UPDATE"))
+        self.assertFalse(services.query_plans.is_read_only("SELECT 1; DELETE FROM t"))
+
+    def test_store_is_bounded_and_keeps_worst_offenders(self):
+        store = services.query_plans.QueryPlanStore(max_entries=2)
+        store.record("SELECT * FROM a WHERE id = 1", 50)
+        store.record("SELECT * FROM a WHERE id = 2", 50)
+        store.record("SELECT * FROM b", 20)
+        store.record("SELECT * FROM c", 30)
+
+        worst = store.worst()
+        self.assertEqual(len(store), 2)
+        self.assertEqual(worst[0].count, 2)
+        self.assertEqual(worst[0].total_ms, 100)
+        self.assertEqual(worst[1].sql, "SELECT * FROM c")
+
+    def test_worker_captures_plan_for_select_only(self):
+        store = services.query_plans.QueryPlanStore()
+        worker = services.query_plans.ExplainWorker(store, analyze=True)
+
+        worker.process("SELECT * FROM django_content_type WHERE id = 1", 25)
+        worker.process("DELETE FROM django_content_type WHERE id = 1", 25)
+
+        select, delete = sorted(store.worst(), key=lambda entry: entry.sql.startswith("DELETE"))
+        self.assertTrue(select.plan)
+        self.assertIsNone(delete.plan)
+        self.assertIsNone(delete.plan_at)
+
+
+class AdminSessionMiddlewareTests(DatabaseTestCase):
+    def get_response(self, request):
+        request.session['seen'] = request.path
+        return HttpResponse()
+
+    def test_cookie_name_is_picked_per_request(self):
+        middleware = AdminSessionMiddleware(self.get_response)
+        factory = RequestFactory()
+
+        admin_response = middleware(factory.get('/admin/'))
+        api_response = middleware(factory.get('/api/items/'))
+
+        self.assertIn('admin_session_id', admin_response.cookies)
+        self.assertNotIn('api_session_id', admin_response.cookies)
+        self.assertIn('api_session_id', api_response.cookies)
+        self.assertEqual(settings.SESSION_COOKIE_NAME, 'sessionid')
+
+    def test_session_is_loaded_from_matching_cookie(self):
+        middleware = AdminSessionMiddleware(self.get_response)
+        factory = RequestFactory()
+        admin_key = middleware(factory.get('/admin/')).cookies['admin_session_id'].value
+
+        request = factory.get('/admin/login/')
+        request.COOKIES['admin_session_id'] = admin_key
+        request.COOKIES['api_session_id'] = 'unrelated'
+        middleware(request)
+
+        self.assertEqual(request.session.session_key, admin_key)
+
+
+class LoadSheddingMiddlewareTests(TestCase):
+    config = {
+        'rules': [{'path': r'^/api/', 'max_queue_seconds': 1, 'retry_after': 7}],
+        'exempt': [r'^/api/health'],
+    }
+
+    def call(self, path, queued_for):
+        request = RequestFactory().get(path, HTTP_X_START_TIME=datetime.now() - timedelta(seconds=queued_for))
+        with override_settings(LOAD_SHEDDING=self.config):
+            return middleware.LoadSheddingMiddleware(lambda request: HttpResponse('view'))(request)
+
+    def test_queue_time_accepts_datetime_and_epoch_formats(self):
+        now = 1_700_000_010.0
+        self.assertAlmostEqual(middleware.get_queue_time('1700000000.0', now), 10)
+        self.assertAlmostEqual(middleware.get_queue_time('t=1700000000000', now), 10)
+        self.assertAlmostEqual(middleware.get_queue_time(1_700_000_000_000_000, now), 10)
+        start = datetime(2026, 1, 1, 12, 0, 0)
+        self.assertEqual(middleware.get_queue_time(start, start + timedelta(seconds=3)), 3)
+        self.assertIsNone(middleware.get_queue_time(None))
+        self.assertIsNone(middleware.get_queue_time('garbage'))
+
+    def test_rejects_stale_requests_with_retry_after(self):
+        response = self.call('/api/items/', queued_for=5)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_passes_fresh_unmatched_and_exempt_requests(self):
+        self.assertEqual(self.call('/api/items/', queued_for=0).content, b'view')
+        self.assertEqual(self.call('/other/', queued_for=5).content, b'view')
+        self.assertEqual(self.call('/api/health/', queued_for=5).content, b'view')
+
+    def test_not_used_without_rules(self):
+        with override_settings(LOAD_SHEDDING={}):
+            with self.assertRaises(MiddlewareNotUsed):
+                middleware.LoadSheddingMiddleware(lambda request: None)
+
+
+class FaultInjectionTests(DatabaseTestCase):
+    def call(self, rules, path='/api/items/', method='get', view=None):
+        request = getattr(RequestFactory(), method)(path)
+        with override_settings(FAULT_INJECTION={'rules': rules, 'seed': 1}):
+            fault_middleware = middleware.FaultInjectionMiddleware(view or (lambda request: HttpResponse('view')))
+            with mock.patch.object(middleware.time, 'sleep') as sleep:
+                return fault_middleware(request), sleep
+
+    def test_percentile_latency_stays_within_configured_range(self):
+        latency = services.fault_injection.Latency({'percentiles': {50: 0.1, 99: 2.0}})
+        rng = services.fault_injection.random.Random(3)
+        samples = sorted(latency.sample(rng) for _ in range(2000))
+
+        self.assertGreaterEqual(samples[0], 0)
+        self.assertLessEqual(samples[-1], 2.0)
+        self.assertLess(samples[len(samples) // 2], 0.15)
+
+    def test_invalid_latency_fails_when_rules_load(self):
+        with self.assertRaises(ValueError):
+            self.call([{'name': 'typo', 'latency': {'fixd': 1}}])
+
+    def test_matching_rule_delays_and_fails(self):
+        rules = [{'name': 'slow', 'path': r'^/api/', 'methods': ['GET'], 'latency': 0.5,
+                  'error': {'rate': 1, 'status': 503}}]
+
+        response, sleep = self.call(rules)
+        self.assertEqual(response.status_code, 503)
+        sleep.assert_called_once_with(0.5)
+
+        response, sleep = self.call(rules, method='post')
+        self.assertEqual(response.content, b'view')
+        sleep.assert_not_called()
+
+    def test_matching_queries_are_delayed(self):
+        def view(request):
+            ContentType.objects.count()
+            return HttpResponse('view')
+
+        response, sleep = self.call([{'name': 'db', 'queries': 'django_content_type', 'query_latency': 0.2}], view=view)
+
+        self.assertEqual(response.content, b'view')
+        sleep.assert_called_once_with(0.2)
+
+    def test_rules_can_be_switched_at_runtime(self):
+        rules = [{'name': 'slow', 'latency': 0.5}]
+        with override_settings(FAULT_INJECTION={'rules': rules}):
+            injector = services.fault_injection.FaultInjector.from_settings()
+            request = RequestFactory().get('/')
+            try:
+                injector.set_enabled('slow', False)
+                self.assertEqual(injector.active_rules(request), [])
+                injector.reset()
+                self.assertEqual(len(injector.active_rules(request)), 1)
+            finally:
+                injector.reset()
+
+    def test_artificial_delay_settings_still_apply(self):
+        request = RequestFactory().get('/api/slow/')
+        with override_settings(ARTIFICIAL_DELAY={'path': '/api/slow', 'delay': 2}):
+            delay_middleware = middleware.ArtificialDelayMiddleware(lambda request: HttpResponse('view'))
+            with mock.patch.object(middleware.time, 'sleep') as sleep:
+                delay_middleware(request)
+        sleep.assert_called_once_with(2)
+
+
+class ViteStandInHandler(http.server.BaseHTTPRequestHandler):
+    body = gzip.compress(b'export default 42;\n' * 100)
+    etag = '"app-v1"'
+    seen_headers = []
+
+    def do_GET(self):
+        ViteStandInHandler.seen_headers.append(dict(self.headers))
+        if self.path != '/static/frontend/app.js':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/javascript')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DevProxyMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ViteStandInHandler)
+        cls.server.protocol_version = 'HTTP/1.1'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def call(self, path, config=None, **headers):
+        with override_settings(DEV_PROXY={'url': self.url, **(config or {})}):
+            proxy = middleware.DevProxyMiddleware(lambda request: HttpResponse('django'))
+        return proxy(RequestFactory().get(path, **headers))
+
+    def test_streams_body_without_decoding(self):
+        response = self.call('/static/frontend/app.js', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual(body, ViteStandInHandler.body)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], ViteStandInHandler.etag)
+        self.assertEqual(ViteStandInHandler.seen_headers[-1]['Accept-Encoding'], 'gzip')
+
+    def test_unread_stream_returns_the_connection(self):
+        Response = middleware.requests.Response
+        with mock.patch.object(Response, 'close', autospec=True, side_effect=Response.close) as close:
+            response = self.call('/static/frontend/app.js')
+            close.assert_not_called()
+            response.close()
+
+        close.assert_called_once()
+
+    def test_buffered_mode_returns_same_body(self):
+        response = self.call('/static/frontend/app.js', config={'stream': False})
+
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, ViteStandInHandler.body)
+
+    def test_conditional_request_passes_304_through(self):
+        response = self.call('/static/frontend/app.js', HTTP_IF_NONE_MATCH=ViteStandInHandler.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(ViteStandInHandler.seen_headers[-1]['If-None-Match'], ViteStandInHandler.etag)
+
+    def test_other_paths_and_unreachable_server(self):
+        self.assertEqual(self.call('/api/items/').content, b'django')
+        with override_settings(DEV_PROXY={'url': 'http://127.0.0.1:1'}):
+            proxy = middleware.DevProxyMiddleware(lambda request: HttpResponse('django'))
+        self.assertEqual(proxy(RequestFactory().get('/static/frontend/app.js')).status_code, 404)
+
+
+class ArticleSerializer(drf_serializers.ModelSerializer):
+    class Meta:
+        model = Article
+        fields = ['id', 'title']
+
+
+class ConditionalArticleList(views.ConditionalListMixin, generics.ListAPIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    serializer_class = ArticleSerializer
+
+    def get_queryset(self):
+        return Article.objects.all()
+
+
+class ConditionalListMixinTests(TemporaryTablesTestCase):
+    test_models = [Article]
+
+    def setUp(self):
+        self.article = Article.objects.create(title='first')
+
+    def get(self, **headers):
+        response = ConditionalArticleList.as_view()(APIRequestFactory().get('/api/articles/', **headers))
+        return response.render()
+
+    def test_unchanged_list_answers_304_without_serializing(self):
+        etag = self.get()['ETag']
+
+        with mock.patch.object(ArticleSerializer, 'to_representation') as to_representation:
+            with self.assertNumQueries(1):
+                response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        to_representation.assert_not_called()
+
+    def test_etag_changes_with_updates_and_deletes(self):
+        etag = self.get()['ETag']
+        self.article.title = 'changed'
+        self.article.save()
+        updated_etag = self.get()['ETag']
+        Article.objects.create(title='second').delete()
+
+        self.assertNotEqual(etag, updated_etag)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=updated_etag).status_code, 304)
+        self.assertNotEqual(self.get(HTTP_IF_NONE_MATCH=updated_etag, QUERY_STRING='title=x')['ETag'], updated_etag)
+
+    def test_falls_back_to_body_hash_for_other_querysets(self):
+        class PlainList(ConditionalArticleList):
+            def get_queryset(self):
+                return list(Article.objects.all())
+
+            def filter_queryset(self, queryset):
+                return queryset
+
+        etag = PlainList.as_view()(APIRequestFactory().get('/api/articles/')).render()['ETag']
+        response = PlainList.as_view()(APIRequestFactory().get('/api/articles/', HTTP_IF_NONE_MATCH=etag)).render()
+
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(response.status_code, 304)
+
+
+class WSGITests(TestCase):
+    def test_requests_are_stamped_with_unique_id_and_start_time(self):
+        seen = []
+
+        def application(environ, start_response):
+            seen.append((environ['HTTP_X_REQUEST_ID'], environ['HTTP_X_START_TIME']))
+            return []
+
+        stamping = wsgi.RequestStampingApplication(application)
+        stamping({'HTTP_X_REQUEST_ID': 'from-client'}, None)
+        stamping({}, None)
+
+        (first_id, first_start), (second_id, _) = seen
+        self.assertNotEqual(first_id, second_id)
+        self.assertTrue(first_id.startswith(f'{wsgi.os.getpid():x}-'))
+        self.assertIsInstance(first_start, datetime)
+
+    def test_proxy_start_time_is_kept(self):
+        seen = []
+        stamping = wsgi.RequestStampingApplication(lambda environ, start_response: seen.append(environ['HTTP_X_START_TIME']))
+        queued_since = datetime.now() - timedelta(seconds=10)
+        stamping({'HTTP_X_REQUEST_START': f't={queued_since.timestamp() * 1000:.0f}'}, None)
+        stamping({'HTTP_X_START_TIME': str(queued_since.timestamp()), 'HTTP_X_REQUEST_START': 'garbage'}, None)
+        stamping({'HTTP_X_START_TIME': 'garbage'}, None)
+
+        self.assertGreater(middleware.get_queue_time(seen[0]), 9)
+        self.assertGreater(middleware.get_queue_time(seen[1]), 9)
+        self.assertLess(middleware.get_queue_time(seen[2]), 1)
+
+    def test_fork_hooks_only_act_before_serving(self):
+        self.addCleanup(setattr, wsgi, '_serving', wsgi._serving)
+        with mock.patch.object(wsgi, 'close_databases') as close_databases:
+            wsgi._serving = False
+            wsgi.before_fork()
+            wsgi.RequestStampingApplication(lambda environ, start_response: [])({}, None)
+            wsgi.before_fork()
+
+        close_databases.assert_called_once()
+
+    def test_application_is_warmed_up_and_frozen(self):
+        with mock.patch.object(wsgi, 'warm_up') as warm_up:
+            with mock.patch.object(wsgi.gc, 'freeze') as freeze:
+                application = wsgi.get_wsgi_application(templates=('admin/login.html',), databases=False)
+
+        self.assertIsInstance(application, wsgi.RequestStampingApplication)
+        warm_up.assert_called_once_with(templates=('admin/login.html',), databases=False)
+        freeze.assert_called_once()
+
+    def test_warm_up_tolerates_missing_templates(self):
+        with self.assertLogs(wsgi.__name__, level='DEBUG') as logs:
+            wsgi.warm_up(templates=('admin/login.html', 'missing.html'), databases=False)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('missing.html', logs.output[0])
+
+
+def make_record(msg, *args, level=logging.INFO, exc_info=None):
+    return logging.LogRecord('djultra.tests', level, __file__, 42, msg, args, exc_info)
+
+
+class StructuredHandlerTests(TestCase):
+    def tearDown(self):
+        RequestIDMiddleware._thread_locals.__dict__.clear()
+
+    def emit(self, record, format='json'):
+        stream = io.StringIO()
+        djultra_logging.StructuredHandler(stream, format=format).emit(record)
+        return stream.getvalue()
+
+    def test_json_line_carries_request_context_and_print_style_args(self):
+        RequestIDMiddleware._thread_locals.request_id = 'abc-1'
+        RequestIDMiddleware._thread_locals.start_time = None
+
+        line = self.emit(make_record('POST data: ', {'a': 1}))
+
+        self.assertTrue(line.endswith('\n'))
+        fields = json.loads(line)
+        self.assertEqual(fields['request_id'], 'abc-1')
+        self.assertEqual(fields['logger'], 'djultra.tests')
+        self.assertEqual(fields['line'], 42)
+        self.assertEqual(fields['ms'], 0)
+        self.assertEqual(fields['message'], "POST data:  {'a': 1}")
+
+    def test_percent_style_and_exceptions(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = make_record('value=%s', 3, level=logging.ERROR, exc_info=sys.exc_info())
+
+        fields = json.loads(self.emit(record))
+
+        self.assertEqual(fields['message'], 'value=3')
+        self.assertIn('ValueError: boom', fields['exc_info'])
+        self.assertIsNone(fields['request_id'])
+
+    def test_logfmt_quotes_values_with_spaces(self):
+        line = self.emit(make_record('two words'), format='logfmt')
+
+        self.assertIn('level=INFO logger=djultra.tests line=42', line)
+        self.assertIn('message="two words"', line)
+        self.assertNotIn('request_id=', line)
+
+
+class QueuedHandlerTests(TestCase):
+    def tearDown(self):
+        RequestIDMiddleware._thread_locals.__dict__.clear()
+
+    def make_handler(self, **kwargs):
+        stream = io.StringIO()
+        handler = djultra_logging.QueuedHandler(djultra_logging.StructuredHandler(stream), **kwargs)
+        self.addCleanup(handler.close)
+        return handler, stream
+
+    def test_request_context_is_taken_at_enqueue(self):
+        handler, stream = self.make_handler()
+        RequestIDMiddleware._thread_locals.request_id = 'abc-2'
+        RequestIDMiddleware._thread_locals.start_time = None
+
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            handler.handle(make_record('failed: ', 'x', level=logging.ERROR, exc_info=sys.exc_info()))
+        handler.flush()
+
+        fields = json.loads(stream.getvalue())
+        self.assertEqual(fields['request_id'], 'abc-2')
+        self.assertEqual(fields['message'], 'failed: x')
+        self.assertIn('ValueError: boom', fields['exc_info'])
+
+    def test_full_queue_drops_and_reports(self):
+        release = threading.Event()
+
+        class SlowHandler(logging.Handler):
+            def emit(self, record):
+                release.wait(5)
+                messages.append(record.getMessage())
+
+        messages = []
+        handler = djultra_logging.QueuedHandler(SlowHandler(), maxsize=1)
+        self.addCleanup(handler.close)
+
+        for i in range(5):
+            handler.handle(make_record(f'record {i}'))
+        release.set()
+        handler.flush()
+
+        self.assertGreaterEqual(handler.dropped, 3)
+        self.assertIn(f'Log queue full, dropped {handler.dropped} records', messages)
+
+    def test_builds_nested_handler_from_config(self):
+        handler = djultra_logging.QueuedHandler(
+            {'class': 'logging.StreamHandler', 'level': 'WARNING', 'formatter': {'format': '%(levelname)s %(message)s'}},
+            overflow='block',
+        )
+        self.addCleanup(handler.close)
+
+        self.assertIsInstance(handler.target, logging.StreamHandler)
+        self.assertEqual(handler.target.level, logging.WARNING)
+        self.assertEqual(handler.target.formatter.format(make_record('hi')), 'INFO hi')
+        with self.assertRaises(ValueError):
+            djultra_logging.QueuedHandler(logging.NullHandler(), overflow='wait')
+
+    def test_forked_child_restarts_open_handlers_only(self):
+        handler, stream = self.make_handler()
+        closed, _ = self.make_handler()
+        closed.close()
+        self.assertIn(handler, djultra_logging.QueuedHandler.instances)
+        self.assertNotIn(closed, djultra_logging.QueuedHandler.instances)
+
+        old_thread = handler._thread
+        djultra_logging._restart_queued_handlers()
+        self.assertIsNot(handler._thread, old_thread)
+        self.assertFalse(closed._thread.is_alive())
+
+        handler.handle(make_record('after fork'))
+        handler.flush()
+        self.assertEqual(json.loads(stream.getvalue())['message'], 'after fork')
+
+
+class LazyLogRecordTests(TestCase):
+    def make_logger(self, handler_level):
+        logger = logging.Logger('djultra.tests.lazy', logging.DEBUG)
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(handler_level)
+        logger.addHandler(handler)
+        return logger, stream
+
+    def test_print_style_arguments_are_formatted_only_when_emitted(self):
+        class Payload:
+            rendered = 0
+
+            def __str__(self):
+                Payload.rendered += 1
+                return 'payload'
+
+        logger, stream = self.make_logger(logging.INFO)
+
+        logger.debug('skipped: ', Payload())
+        self.assertEqual(Payload.rendered, 0)
+
+        logger.info('sent: ', Payload(), 2)
+        self.assertEqual(Payload.rendered, 1)
+        self.assertEqual(stream.getvalue(), 'sent: payload 2\n')
+
+    def test_percent_style_and_dict_arguments(self):
+        logger, stream = self.make_logger(logging.DEBUG)
+
+        logger.info('value=%s', 3)
+        logger.info('data: ', {'a': 1})
+        logger.info('100% plain')
+
+        self.assertEqual(stream.getvalue().splitlines(), ['value=3', "data:  {'a': 1}", '100% plain'])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_command(self):
+        stdout = io.StringIO()
+        middleware = ['djultra.middleware.RequestIDMiddleware', 'django.middleware.common.CommonMiddleware']
+        with override_settings(ALLOWED_HOSTS=['example.com'], MIDDLEWARE=middleware):
+            call_command('benchmark', 'logging', number=2, stdout=stdout)
+
+        self.assertIsNone(getattr(RequestIDMiddleware._thread_locals, 'request_id', None))
+
+        self.assertIn('debug off in logger, guarded call', stdout.getvalue())
+        self.assertIn('CustomRichHandler, traceback', stdout.getvalue())
+        self.assertIn('middleware stack, logging share', stdout.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('benchmark', 'nothing')
+
+    def test_budget_check_compares_against_the_baseline(self):
+        Result = benchmarks.Result
+        results = [Result('plain StreamHandler', 1e-6), Result('CustomRichHandler', 5e-4), Result('StructuredHandler json', 2e-5)]
+
+        failures = benchmarks.check('logging', results + [Result('QueuedHandler enqueue', 1e-6)])
+
+        self.assertEqual([name for name, ratio, budget in failures], ['StructuredHandler json', 'CustomRichHandler'])
+
+
+class DeduplicateFilterTests(TestCase):
+    def setUp(self):
+        DeduplicateFilter = djultra_logging.DeduplicateFilter
+        self.filter = DeduplicateFilter(window=10)
+        self.addCleanup(DeduplicateFilter.suppressed.clear)
+
+    def make_record(self, instance, created, lineno=42):
+        record = make_record('Serializer method not callable: instance=%s', instance, level=logging.WARNING)
+        record.created = created
+        record.lineno = lineno
+        return record
+
+    def test_floods_collapse_into_one_record_and_a_summary(self):
+        passed = [record for record in (self.make_record(i, 1000 + i / 1000) for i in range(1000)) if self.filter.filter(record)]
+
+        self.assertEqual([record.getMessage() for record in passed], ['Serializer method not callable: instance=0'])
+        self.assertEqual(djultra_logging.DeduplicateFilter.suppressed['djultra.tests:42'], 999)
+
+        later = self.make_record('x', 1011)
+        self.assertTrue(self.filter.filter(later))
+        self.assertEqual(later.getMessage(), 'Serializer method not callable: instance=x (suppressed 999 similar)')
+
+    def test_call_sites_are_limited_separately(self):
+        self.assertTrue(self.filter.filter(self.make_record(1, 1000)))
+        self.assertTrue(self.filter.filter(self.make_record(1, 1000, lineno=43)))
+        self.assertFalse(self.filter.filter(self.make_record(2, 1001)))
+
+
+class RequestBufferHandlerTests(TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = djultra_logging.RequestBufferHandler(
+            djultra_logging.StructuredHandler(self.stream), threshold='WARNING', capacity=3, slow_ms=100)
+        self.addCleanup(RequestIDMiddleware._thread_locals.__dict__.clear)
+
+    def log(self, request_id, msg, level=logging.DEBUG):
+        RequestIDMiddleware._thread_locals.request_id = request_id
+        RequestIDMiddleware._thread_locals.start_time = None
+        self.handler.handle(make_record(msg, level=level))
+
+    def messages(self):
+        return [json.loads(line)['message'] for line in self.stream.getvalue().splitlines()]
+
+    def test_held_back_records_are_written_for_bad_requests_only(self):
+        self.log('ok', 'fast and fine')
+        self.handler.end_request('ok', 200, 5)
+        self.log('slow', 'slow one')
+        self.handler.end_request('slow', 200, 150)
+        self.log('failed', 'server error')
+        self.handler.end_request('failed', 503, 5)
+
+        self.assertEqual(self.messages(), ['slow one', 'server error'])
+
+    def test_error_record_flushes_and_later_records_pass(self):
+        for i in range(5):
+            self.log('a', f'step {i}')
+        self.log('a', 'boom', level=logging.ERROR)
+        self.log('a', 'after')
+        self.handler.end_request('a', 200, 5)
+
+        # Only the latest `capacity` records are kept
+        self.assertEqual(self.messages(), ['step 2', 'step 3', 'step 4', 'boom', 'after'])
+
+    def test_records_outside_requests_only_pass_threshold(self):
+        self.log(None, 'dropped')
+        self.log(None, 'kept', level=logging.WARNING)
+
+        self.assertEqual(self.messages(), ['kept'])
+
+    def test_request_id_middleware_ends_the_request(self):
+        middleware = RequestIDMiddleware(lambda request: HttpResponse(status=500))
+        request = RequestFactory().get('/', HTTP_X_REQUEST_ID='req-1')
+
+        with mock.patch.object(self.handler, 'end_request') as end_request:
+            middleware(request)
+
+        self.assertEqual(end_request.call_args.args[:2], ('req-1', 500))
+
+    def test_records_of_a_raising_view_are_flushed(self):
+        def view(request):
+            self.log('req-2', 'before the crash')
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            RequestIDMiddleware(view)(RequestFactory().get('/', HTTP_X_REQUEST_ID='req-2'))
+
+        self.assertEqual(self.messages(), ['before the crash'])
+        self.assertNotIn('req-2', self.handler._buffers)
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.trace_file = Path(temp_dir.name) / 'spans.jsonl'
+        settings_override = override_settings(DJU_TRACE_FILE=str(self.trace_file))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def spans(self):
+        return [
+            json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+            for line in self.trace_file.read_text().splitlines()
+        ]
+
+    def test_parse_traceparent(self):
+        trace_id, span_id = '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'
+
+        self.assertEqual(tracing.parse_traceparent(f'00-{trace_id}-{span_id}-01'), (trace_id, span_id))
+        self.assertIsNone(tracing.parse_traceparent(f'00-{"0" * 32}-{span_id}-01'))
+        self.assertIsNone(tracing.parse_traceparent('garbage'))
+        self.assertIsNone(tracing.parse_traceparent(None))
+
+    def test_nested_spans_share_the_trace(self):
+        with tracing.start_span('outer') as outer:
+            with tracing.start_span('inner', attributes={'rows': 3, 'cached': True}):
+                self.assertEqual(tracing.current_traceparent().split('-')[1], outer.trace_id)
+        self.assertIsNone(tracing.current_traceparent())
+
+        inner, outer_span = self.spans()
+        self.assertEqual(inner['parentSpanId'], outer.span_id)
+        self.assertEqual(inner['traceId'], outer.trace_id)
+        self.assertNotIn('parentSpanId', outer_span)
+        self.assertIn({'key': 'rows', 'value': {'intValue': '3'}}, inner['attributes'])
+        self.assertIn({'key': 'cached', 'value': {'boolValue': True}}, inner['attributes'])
+
+    def test_disabled_without_trace_file(self):
+        with override_settings(DJU_TRACE_FILE=''):
+            with tracing.start_span('nothing') as span:
+                self.assertIsNone(span)
+        self.assertFalse(self.trace_file.exists())
+
+    def test_request_span_continues_the_callers_trace(self):
+        trace_id, parent_id = '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'
+        middleware = RequestIDMiddleware(lambda request: HttpResponse(status=502))
+
+        middleware(RequestFactory().get('/orders/', HTTP_TRACEPARENT=f'00-{trace_id}-{parent_id}-01'))
+
+        span, = self.spans()
+        self.assertEqual((span['traceId'], span['parentSpanId']), (trace_id, parent_id))
+        self.assertEqual(span['name'], 'GET /orders/')
+        self.assertEqual(span['kind'], tracing.KIND_SERVER)
+        self.assertEqual(span['status'], {'code': tracing.STATUS_ERROR, 'message': 'HTTP 502'})
+
+    def test_email_task_continues_the_enqueuing_trace(self):
+        with mock.patch.object(services.email, 'render_to_string', return_value='<p>Hi</p>'):
+            with tracing.start_span('request') as request_span:
+                services.send_templated_email('Hi', 'mail.html', {}, ['a@example.com'])
+
+        spans = {span['name']: span for span in self.spans()}
+        self.assertEqual(spans['enqueue send_email_task']['parentSpanId'], request_span.span_id)
+        self.assertEqual(spans['send_email_task']['parentSpanId'], spans['enqueue send_email_task']['spanId'])
+        self.assertEqual({span['traceId'] for span in spans.values()}, {request_span.trace_id})
+
+
+class DecimalFieldParseManyTests(TestCase):
+    def setUp(self):
+        self.field = fields.DecimalField(max_digits=12, decimal_places=3)
+
+    def test_german_column(self):
+        parsed, errors = self.field.parse_many(['1.234', '2.500,50', '', None, 'n/a', '-3,5', '1,234'])
+
+        self.assertEqual(parsed, [Decimal('1234'), Decimal('2500.50'), None, None, None, Decimal('-3.5'), Decimal('1.234')])
+        self.assertEqual([(index, value) for index, value, message in errors], [(4, 'n/a')])
+
+    def test_english_column(self):
+        parsed, errors = self.field.parse_many(['1,234', '1.5', '2,000.25', '1.234'])
+
+        self.assertEqual(parsed, [Decimal('1234'), Decimal('1.5'), Decimal('2000.25'), Decimal('1.234')])
+        self.assertEqual(errors, [])
+
+    def test_text_column_with_other_values(self):
+        values = ['1.234,5', 'n/a', '', '1.2345', '12', ' 7,25 ']
+        parsed, errors = self.field.parse_many(values)
+
+        self.assertEqual(parsed, [Decimal('1234.5'), None, None, Decimal('1.2345'), Decimal('12'), Decimal('7.25')])
+        self.assertEqual([(index, value) for index, value, message in errors], [(1, 'n/a')])
+        self.assertEqual(parsed, [self.field.parse_number(value, 'de') if value != 'n/a' else None for value in values])
+
+    def test_column_without_telling_values_parses_like_to_python(self):
+        values = ['1.234', '1,234', '12']
+
+        self.assertEqual(self.field.parse_many(values)[0], [self.field.to_python(value) for value in values])
+        self.assertIsNone(self.field.detect_locale(values))
+
+
+class DateFieldParsingTests(TestCase):
+    def setUp(self):
+        self.field = fields.DateField()
+
+    def parse(self, parse, value):
+        try:
+            return parse(value)
+        except ValidationError as e:
+            return e.messages
+
+    def test_same_results_as_the_legacy_parser(self):
+        from .benchmarks.fields import legacy_parse_date, messy_dates
+
+        for value in messy_dates(2000, distinct=2000):
+            with self.subTest(value=value):
+                self.assertEqual(self.parse(self.field.to_python, value), self.parse(legacy_parse_date, value))
+
+    def test_format_order_is_kept(self):
+        # '%y%m%d' comes before '%Y' in DATE_FORMATS
+        self.assertEqual(self.field.to_python('2018'), date(2020, 1, 8))
+        self.assertEqual(self.field.to_python('18 ABR/APR 2027'), date(2027, 4, 18))
+        self.assertEqual(self.field.to_python('3rd March 20 21'), date(2021, 3, 3))
+
+    def test_parse_many(self):
+        parsed, errors = self.field.parse_many(['25.10.2019', '', None, 'someday', '14 FÉV 24'])
+
+        self.assertEqual(parsed, [date(2019, 10, 25), None, None, None, date(2024, 2, 14)])
+        self.assertEqual(errors, [(3, 'someday', "Date format for 'SOMEDAY' not recognized")])
+
+
+class DateFieldDescriptorTests(TemporaryTablesTestCase):
+    Event = create_test_model('DescriptorEvent', day=fields.DateField())
+    test_models = (Event,)
+
+    def test_database_values_are_not_parsed(self):
+        with mock.patch.object(fields.DateField, 'to_python') as to_python:
+            event = self.Event.from_db('default', ['id', 'day'], (1, date(2024, 2, 14)))
+            self.Event.from_db('default', ['id', 'day'], (2, None))
+
+        to_python.assert_not_called()
+        self.assertEqual(event.day, date(2024, 2, 14))
+
+    def test_text_is_parsed_on_assignment(self):
+        event = self.Event(day='14 FÉV 24')
+        self.assertEqual(event.day, date(2024, 2, 14))
+
+        with self.assertRaises(ValidationError):
+            event.day = 'someday'
+
+    def test_deferred_field_is_loaded(self):
+        self.Event.objects.create(day='25.10.2019')
+
+        event = self.Event.objects.defer('day').get()
+
+        self.assertEqual(event.day, date(2019, 10, 25))
+
+
+class CountryFieldTests(TestCase):
+    def setUp(self):
+        self.field = fields.CountryField(mapping={'ALMANIA': 'DE', 'ATLANTIS': 'XX'})
+
+    def test_normalize_many(self):
+        results = self.field.normalize_many([
+            'de', 'deu', 276, 'Germany', 'U.S.A.', 'Deutschland', 'Côte d’Ivoire', 'the Netherlands',
+            'Almania', 'Atlantis', 'Narnia', '', None,
+        ])
+
+        self.assertEqual(results, [
+            ('DE', 'code'), ('DE', 'alpha3'), ('DE', 'numeric'), ('DE', 'name'), ('US', 'alpha3'),
+            ('DE', 'localized'), ('CI', 'name'), ('NL', 'name'), ('DE', 'mapping'), (None, 'unknown'),
+            (None, 'unknown'), (None, None), (None, None),
+        ])
+
+    def test_clean(self):
+        self.assertEqual(self.field.clean(' holland ', None), 'NL')
+        self.assertEqual(self.field.clean('Türkiye', None), 'TR')
+        self.assertEqual(self.field.clean('Turkey', None), 'TR')
+
+    def test_unknown_value_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.field.clean('Narnia', None)
+
+
+class CleanRowsTests(TemporaryTablesTestCase):
+    Person = create_test_model(
+        'ImportPerson',
+        full_name=fields.CharField(max_length=10),
+        income=fields.DecimalField(max_digits=8, decimal_places=2),
+        born=fields.DateField(),
+        country=fields.CountryField(),
+        gender=fields.GenderField(),
+        children=fields.IntegerField(),
+    )
+    test_models = (Person,)
+
+    rows = [
+        {'full_name': '"Anna"', 'income': '1.234,50', 'born': '25.10.1979', 'country': 'Deutschland', 'gender': 'f', 'children': '2'},
+        {'full_name': 'Bob', 'income': '1.234', 'born': 'someday', 'country': 'U.S.A.', 'gender': 'male', 'children': ''},
+        {'full_name': 'Christopher', 'income': '99.999.999', 'born': '', 'country': 'Narnia', 'gender': '', 'children': 'two'},
+    ]
+
+    def test_clean_rows(self):
+        columns, errors = fields.clean_rows(self.Person, self.rows)
+
+        self.assertEqual(columns['full_name'], ['Anna', 'Bob', None])
+        # The column is German, so "1.234" is a thousand
+        self.assertEqual(columns['income'], [Decimal('1234.50'), Decimal('1234'), None])
+        self.assertEqual(columns['born'], [date(1979, 10, 25), None, None])
+        self.assertEqual(columns['country'], ['DE', 'US', None])
+        self.assertEqual(columns['gender'], ['F', 'M', 'U'])
+        self.assertEqual(columns['children'], [2, None, None])
+        self.assertEqual([(error.row, error.field, error.value) for error in errors], [
+            (1, 'born', 'someday'),
+            (2, 'full_name', 'Christopher'),
+            (2, 'income', '99.999.999'),
+            (2, 'country', 'Narnia'),
+            (2, 'children', 'two'),
+        ])
+
+    def test_process_pool_gives_the_same_result(self):
+        rows = self.rows * 5
+
+        self.assertEqual(fields.clean_rows(self.Person, rows, processes=2, chunk_size=4), fields.clean_rows(self.Person, rows))
+
+    def test_concurrent_calls_keep_their_own_columns(self):
+        inputs = [[('1,5', 'Anna'), ('2,5', 'Bob')], [('3,5', 'Carl')]]
+        expected = [fields.clean_rows(self.Person, rows, fields=['income', 'full_name']) for rows in inputs]
+        results = [None] * len(inputs)
+        # Both calls are parsing their first column at the same time
+        barrier = threading.Barrier(len(inputs), timeout=5)
+        parse_many = fields.DecimalField.parse_many
+
+        def wait_and_parse(field, values, **kwargs):
+            barrier.wait()
+            return parse_many(field, values, **kwargs)
+
+        def clean(i):
+            try:
+                results[i] = fields.clean_rows(self.Person, inputs[i], fields=['income', 'full_name'])
+            except Exception as e:
+                results[i] = e
+
+        with mock.patch.object(fields.DecimalField, 'parse_many', wait_and_parse):
+            threads = [threading.Thread(target=clean, args=(i,)) for i in range(len(inputs))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results, expected)
+
+    def test_decimals_are_validated_by_their_digits(self):
+        # 1,0 and 1,000 parse to equal Decimals, but only one has 2 places
+        for values in (['1,0', '1,000', '2,5'], ['1,000', '1,0', '2,5']):
+            columns, errors = fields.clean_rows(self.Person, [(value,) for value in values], fields=['income'])
+
+            self.assertEqual([error.value for error in errors], ['1,000'])
+
+    def test_relation_columns_are_cleaned_in_this_process(self):
+        Membership = create_test_model('ImportMembership', group=models.ForeignKey(Group, models.CASCADE, related_name='+'))
+        group = Group.objects.create(name='staff')
+        rows = [(group.pk,), (group.pk + 1,)] * 3
+
+        # A mock can't be pickled, so all three chunks ran here
+        with mock.patch.object(fields, '_clean_chunk', wraps=fields._clean_chunk) as clean_chunk:
+            columns, errors = fields.clean_rows(Membership, rows, fields=['group'], processes=2, chunk_size=2)
+
+        self.assertEqual(clean_chunk.call_count, 3)
+        self.assertEqual(columns['group'], [group.pk, None] * 3)
+        self.assertEqual([error.row for error in errors], [1, 3, 5])
+        self.assertEqual(Group.objects.get().name, 'staff')
+
+    def test_sequence_rows_and_build_instances(self):
+        columns, errors = fields.clean_rows(self.Person, [('Anna', '12,5'), ('Bob', 'x')], fields=['full_name', 'income'])
+
+        self.Person.objects.bulk_create(fields.build_instances(self.Person, columns, errors))
+
+        self.assertEqual(list(self.Person.objects.values_list('full_name', 'income')), [('Anna', Decimal('12.50'))])
+
+
+class ImportRowsTests(TemporaryTablesTestCase):
+    Contact = create_test_model(
+        'ImportContact',
+        full_name=fields.CharField(max_length=20),
+        born=fields.DateField(verbose_name='Date of birth'),
+        country=fields.CountryField(),
+        balance=fields.DecimalField(max_digits=10, decimal_places=2),
+    )
+    test_models = (Contact,)
+
+    def write_csv(self, text):
+        path = Path(tempfile.mkdtemp()) / 'contacts.csv'
+        path.write_text(text, encoding='utf-8')
+        return path
+
+    def test_import_rows(self):
+        path = self.write_csv(
+            'Name;Date of Birth;Country;Balance;Notes\n'
+            'Anna;25.10.1979;Deutschland;1.234,50;x\n'
+            'Bob;someday;Narnia;12,00;y\n'
+            'Cem;3rd March 20 21;Türkiye;;z\n'
+        )
+        rejects = path.with_name('rejects.csv')
+        progress = []
+
+        stats = services.importer.import_rows(
+            self.Contact, path, columns={'Name': 'full_name'}, chunk_size=2, rejects=rejects, progress=progress.append,
+        )
+
+        self.assertEqual(stats[:3], (3, 2, 1))
+        self.assertEqual([item[:3] for item in progress], [(2, 1, 1), (3, 2, 1)])
+        self.assertEqual(list(self.Contact.objects.order_by('id').values_list('full_name', 'born', 'country', 'balance')), [
+            ('Anna', date(1979, 10, 25), 'DE', Decimal('1234.50')),
+            ('Cem', date(2021, 3, 3), 'TR', None),
+        ])
+        self.assertEqual(rejects.read_text().splitlines(), [
+            'row,Name,Date of Birth,Country,Balance,Notes,errors',
+            "3,Bob,someday,Narnia,\"12,00\",y,born: Date format for 'SOMEDAY' not recognized; country: Unknown country: Narnia",
+        ])
+
+    def test_number_locale_is_decided_once_per_file(self):
+        path = self.write_csv('full_name,balance\nAnna,"1,234.50"\nBob,1.234\n')
+
+        stats = services.importer.import_rows(self.Contact, path, chunk_size=1)
+
+        # An English file, so Bob's 1.234 has three decimals, not 1234
+        self.assertEqual(stats.rejected, 1)
+        self.assertEqual(list(self.Contact.objects.values_list('balance', flat=True)), [Decimal('1234.50')])
+
+    def test_file_is_closed_when_no_column_matches(self):
+        path = self.write_csv('Notes\nx\n')
+        opened = []
+
+        def tracking_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+
+        with mock.patch.object(services.importer, 'open', tracking_open, create=True):
+            with self.assertRaises(ValueError):
+                services.importer.import_rows(self.Contact, path)
+
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+    def test_unknown_sheet_closes_the_workbook(self):
+        workbook = mock.MagicMock(sheetnames=['Contacts'])
+        openpyxl = mock.Mock(**{'load_workbook.return_value': workbook})
+
+        with mock.patch.dict(sys.modules, {'openpyxl': openpyxl}):
+            with self.assertRaisesRegex(ValueError, "No sheet 'People'.*Contacts"):
+                services.importer.read_xlsx('contacts.xlsx', sheet='People')
+
+        workbook.close.assert_called_once_with()
+
+    def test_command(self):
+        path = self.write_csv('full_name,balance\nAnna,"1,234.50"\n')
+        out = io.StringIO()
+
+        with mock.patch('django.apps.apps.get_model', return_value=self.Contact):
+            call_command('import_rows', 'djultra.ImportContact', str(path), stdout=out)
+
+        self.assertIn('Imported 1 of 1 rows', out.getvalue())
+        self.assertEqual(self.Contact.objects.get().balance, Decimal('1234.50'))
+
+        with self.assertRaises(CommandError):
+            call_command('import_rows', 'djultra.NoSuchModel', str(path))
+
+
+class JSONFieldTests(TemporaryTablesTestCase):
+    Profile = create_test_model('JSONProfile', data=fields.JSONField(), lazy_data=fields.JSONField(lazy=True))
+    test_models = (Profile,)
+
+    def test_decoded_values_are_not_decoded_again(self):
+        field = fields.JSONField()
+
+        with mock.patch.object(fields, 'json_loads') as json_loads:
+            value = field.from_db_value({'a': {'b': 1}}, None, connection)
+
+        json_loads.assert_not_called()
+        self.assertEqual(value.a.b, 1)
+
+    def test_from_db_value(self):
+        field = fields.JSONField()
+
+        self.assertEqual(field.from_db_value('{"a": [1, NaN]}', None, connection).a[0], 1)
+        self.assertEqual(field.from_db_value(b'[1]', None, connection), [1])
+        # SQLite's json_extract returns strings unquoted
+        self.assertEqual(field.from_db_value('plain text', None, connection), 'plain text')
+
+    def test_lazy_field_wraps_on_first_read(self):
+        self.Profile.objects.create(data={'theme': 'dark'}, lazy_data={'layout': {'columns': 3}})
+
+        profile = self.Profile.objects.get()
+
+        self.assertIsInstance(profile.data, fields.DotDict)
+        self.assertIs(type(profile.__dict__['lazy_data']), dict)
+        self.assertEqual(profile.lazy_data.layout.columns, 3)
+        self.assertIs(profile.lazy_data, profile.__dict__['lazy_data'])
+        self.assertEqual(self.Profile.objects.defer('lazy_data').get().lazy_data.layout.columns, 3)
+        self.assertEqual(self.Profile._meta.get_field('lazy_data').deconstruct()[3]['lazy'], True)
+
+    def test_lazy_field_saves_its_view(self):
+        profile = self.Profile.objects.create(lazy_data={'layout': {'columns': 3}})
+        profile = self.Profile.objects.get(pk=profile.pk)
+
+        self.assertIsInstance(profile.lazy_data, fields.DotView)
+        profile.lazy_data.layout.columns = 4
+        profile.save()
+
+        self.assertEqual(self.Profile.objects.get().lazy_data, {'layout': {'columns': 4}})
+
+
+class DotViewTests(TestCase):
+    def test_wraps_without_copying(self):
+        data = {'settings': {'layout': {'columns': 2}}, 'widgets': [{'name': 'clock'}, 1]}
+        view = fields.DotView(data)
+
+        view.settings.layout.columns = 3
+        view.widgets[0].name = 'weather'
+        view.widgets.append(fields.DotView({'name': 'news'}))
+        view.theme = {'dark': True}
+
+        self.assertEqual(data, {
+            'settings': {'layout': {'columns': 3}}, 'widgets': [{'name': 'weather'}, 1, {'name': 'news'}], 'theme': {'dark': True},
+        })
+        self.assertIs(view.settings, view['settings'])
+        self.assertIs(view.settings.data, data['settings'])
+        self.assertEqual([widget for widget in view.widgets][0].name, 'weather')
+        self.assertEqual(view, data)
+
+    def test_dotdict_api(self):
+        view = fields.DotView({'a': {'b': 1}})
+
+        self.assertEqual(view.get('a').b, 1)
+        self.assertEqual(view.get('missing', 2), 2)
+        self.assertEqual(dict(view.items())['a'].b, 1)
+        self.assertFalse(hasattr(view, 'missing'))
+        del view.a
+        self.assertEqual(len(view), 0)
+        with self.assertRaises(AttributeError):
+            del view.a
+
+    def test_copy_and_json(self):
+        view = fields.DotView({'a': [{'b': 1}]})
+        view.a[0].b
+
+        copied = copy.copy(view)
+        copied.c = 1
+
+        self.assertNotIn('c', view)
+        self.assertEqual(pickle.loads(pickle.dumps(view)), view)
+        self.assertEqual(json.dumps(view, cls=djultra_serializers.CustomJSONEncoder), '{"a": [{"b": 1}]}')
+        self.assertEqual(JSONRenderer().render(view), b'{"a":[{"b":1}]}')
+
+
+class JSONOnlyTests(TemporaryTablesTestCase):
+    Document = create_test_model('JSONOnlyDocument', base=Base, title=fields.CharField(), settings=fields.JSONField())
+    test_models = (Document,)
+
+    def setUp(self):
+        self.Document.objects.create(title='a', settings={
+            'theme': 'dark', 'layout': {'columns': 3, 'widgets': [{'name': 'clock'}]}, 'history': list(range(100)),
+        })
+
+    def test_projection(self):
+        with self.assertNumQueries(1):
+            document = self.Document.objects.json_only('settings', ['theme', 'layout.widgets', 'missing.key']).get()
+
+            self.assertEqual(document.settings, {'theme': 'dark', 'layout': {'widgets': [{'name': 'clock'}]}})
+            self.assertEqual(document.settings.layout.widgets[0].name, 'clock')
+            self.assertEqual(document.title, 'a')
+
+        self.assertNotIn('history', str(self.Document.objects.json_only('settings', 'theme').query))
+
+    def test_chained_projections(self):
+        queryset = self.Document.objects.json_only('settings', 'theme').filter(title='a').json_only('settings', 'layout.columns')
+
+        self.assertEqual(queryset.get().settings, {'theme': 'dark', 'layout': {'columns': 3}})
+        self.assertEqual(list(self.Document.objects.values_list('title', flat=True)), ['a'])
+
+    def test_partial_document_is_not_saved(self):
+        document = self.Document.objects.json_only('settings', 'theme').get()
+        document.title = 'b'
+        document.save()
+
+        document.refresh_from_db(fields=['settings'])
+
+        self.assertEqual(document.title, 'b')
+        self.assertEqual(len(document.settings.history), 100)
+        document.settings.theme = 'light'
+        document.save()
+        self.assertEqual(self.Document.objects.get().settings.theme, 'light')
+
+    def test_replaced_document_is_saved(self):
+        document = self.Document.objects.json_only('settings', 'theme').get()
+        document.title = 'b'
+        document.settings = {'theme': 'light', 'brand': 'new'}
+        document.save()
+
+        self.assertEqual(self.Document.objects.values_list('title', 'settings').get(), ('b', {'theme': 'light', 'brand': 'new'}))
+
+    def test_values_leave_out_the_extracted_paths(self):
+        queryset = self.Document.objects.json_only('settings', 'theme')
+
+        self.assertEqual(set(queryset.values().get()), {'id', 'created_at', 'updated_at', 'title', 'settings'})
+        self.assertEqual(len(queryset.values_list().get()), 5)
+
+
+class DynamicFieldsModelSerializerTests(DatabaseTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='anna', first_name='Anna', last_name='Smith')
+        self.user.groups.add(Group.objects.create(name='admins'))
+        DynamicFieldsModelSerializer._field_plans.clear()
+
+    def serialize(self):
+        return DynamicFieldsModelSerializer(
+            User.objects.all(), many=True, model=User, fields=['id', 'username'], dynamic=['get_full_name'],
+            relations={'groups': {'model': Group, 'fields': ['name']}},
+        ).data
+
+    def test_field_plan_is_built_once(self):
+        with mock.patch.object(DynamicFieldsModelSerializer, 'get_fields', autospec=True,
+                               side_effect=drf_serializers.ModelSerializer.get_fields) as get_fields:
+            first = self.serialize()
+            second = self.serialize()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, [{'id': self.user.pk, 'username': 'anna', 'get_full_name': 'Anna Smith', 'groups': [{'name': 'admins'}]}])
+        # The user and the nested group serializer
+        self.assertEqual(get_fields.call_count, 2)
+
+    def test_field_plan_cache_keeps_the_most_recently_used(self):
+        with mock.patch.object(DynamicFieldsModelSerializer, 'field_plan_cache_size', 2):
+            for fields in (['id'], ['username'], ['id'], ['email']):
+                DynamicFieldsModelSerializer(self.user, model=User, fields=fields).data
+
+        self.assertEqual([key[2] for key in DynamicFieldsModelSerializer._field_plans], [('id',), ('email',)])
+
+    def test_relation_subclass_is_memoized(self):
+        self.assertIs(
+            create_custom_subclass(DynamicFieldsModelSerializer, Group, 'groups'),
+            create_custom_subclass(DynamicFieldsModelSerializer, Group, 'groups'),
+        )
+
+    def test_relations_without_dynamic_fields(self):
+        data = DynamicFieldsModelSerializer(
+            self.user, model=User, fields=['username'], relations={'groups': {'model': Group, 'fields': ['name']}},
+        ).data
+
+        self.assertEqual(data, {'username': 'anna', 'groups': [{'name': 'admins'}]})
+
+
+with isolate_apps('djultra'):
+    class Publisher(models.Model):
+        title = models.CharField(max_length=100)
+        city = models.CharField(max_length=100)
+
+        class Meta:
+            app_label = 'djultra'
+
+        def get_label(self):
+            return f'{self.title} ({self.city})'
+
+    class Book(models.Model):
+        title = models.CharField(max_length=100)
+        summary = models.TextField(blank=True)
+        publisher = models.ForeignKey(Publisher, models.CASCADE, related_name='books')
+
+        class Meta:
+            app_label = 'djultra'
+
+
+class BookSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = Book
+        fields = '__all__'
+
+
+class OptimizedBookList(views.OptimizedQuerySetMixin, generics.ListAPIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    serializer_class = BookSerializer
+    queryset = Book.objects.all()
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'model': Book, 'fields': ['title'], 'dynamic': ['publisher.title']}
+
+
+class OptimizeQuerysetTests(TemporaryTablesTestCase):
+    test_models = [Publisher, Book]
+
+    def setUp(self):
+        DynamicFieldsModelSerializer._field_plans.clear()
+        DynamicFieldsModelSerializer._queryset_plans.clear()
+        for number in range(3):
+            publisher = Publisher.objects.create(title=f'publisher {number}', city='Berlin')
+            Book.objects.create(title=f'book {number}a', publisher=publisher)
+            Book.objects.create(title=f'book {number}b', publisher=publisher)
+
+    def serialize(self, queryset, queries, **kwargs):
+        serializer = DynamicFieldsModelSerializer(queryset, many=True, model=queryset.model, **kwargs)
+        queryset = serializer.child.optimize_queryset(queryset)
+        with self.assertNumQueries(queries):
+            return DynamicFieldsModelSerializer(queryset, many=True, model=queryset.model, **kwargs).data, queryset
+
+    def test_dotted_dynamic_fields_join_forward_relations(self):
+        data, queryset = self.serialize(Book.objects.order_by('pk'), 1, fields=['title'], dynamic=['publisher.title'])
+
+        self.assertEqual(data[0], {'title': 'book 0a', 'publisher_title': 'publisher 0'})
+        self.assertEqual(queryset.query.select_related, {'publisher': {}})
+        self.assertEqual(queryset.query.deferred_loading, ({'title', 'publisher', 'publisher__title'}, False))
+
+    def test_relations_are_prefetched_with_their_own_plan(self):
+        data, queryset = self.serialize(
+            Publisher.objects.order_by('pk'), 2, fields=['title'],
+            relations={'books': {'model': Book, 'fields': ['title']}},
+        )
+
+        self.assertEqual(data[0], {'title': 'publisher 0', 'books': [{'title': 'book 0a'}, {'title': 'book 0b'}]})
+        books = queryset._prefetch_related_lookups[0].queryset
+        self.assertEqual(books.query.deferred_loading, ({'title', 'publisher'}, False))
+
+    def test_methods_load_all_columns(self):
+        data, queryset = self.serialize(Publisher.objects.order_by('pk'), 1, fields=['id'], dynamic=['get_label'])
+
+        self.assertEqual(data[0]['get_label'], 'publisher 0 (Berlin)')
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(), True))
+
+    def test_view_mixin_optimizes_the_list(self):
+        with mock.patch.object(DynamicFieldsModelSerializer, 'get_queryset_plan',
+                               autospec=True, side_effect=DynamicFieldsModelSerializer.get_queryset_plan) as plan:
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    response = OptimizedBookList.as_view()(APIRequestFactory().get('/api/books/')).render()
+
+        self.assertEqual(json.loads(response.content)[0], {'title': 'book 0a', 'publisher_title': 'publisher 0'})
+        # Planned once, the second request reuses the cached plan
+        self.assertEqual(plan.call_count, 1)
+
+    def test_view_mixin_leaves_other_actions_alone(self):
+        class BookDetail(views.OptimizedQuerySetMixin, generics.RetrieveUpdateAPIView):
+            authentication_classes = []
+            permission_classes = [permissions.AllowAny]
+            serializer_class = BookSerializer
+            queryset = Book.objects.all()
+
+        view = BookDetail()
+        view.setup(APIRequestFactory().get('/'), pk=Book.objects.first().pk)
+        view.format_kwarg = None
+
+        self.assertEqual(view.get_queryset().query.deferred_loading, (frozenset(), True))
+        self.assertEqual(view.get_object().summary, '')
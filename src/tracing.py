@@ -0,0 +1,168 @@
+# djultra/tracing.py
+#
+# Lightweight span tracing across requests, django-tasks and fastmanage
+# workers, without an OpenTelemetry SDK or collector. Trace context travels
+# as a W3C `traceparent` string: the HTTP header, a task kwarg, or the
+# TRACEPARENT environment variable. Finished spans are appended to
+# DJU_TRACE_FILE (setting or environment variable), one OTLP/JSON
+# ExportTraceServiceRequest per line, the format of the OpenTelemetry
+# collector's file exporter, so any OTLP tooling can load the file.
+# Without DJU_TRACE_FILE, start_span() is a no-op.
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+KIND_PRODUCER = 4
+KIND_CONSUMER = 5
+
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+_current_span = contextvars.ContextVar('djultra_current_span', default=None)
+_write_lock = threading.Lock()
+
+
+def get_trace_file():
+    # The fastmanage client runs before Django is set up; only the
+    # environment counts there
+    path = getattr(settings, 'DJU_TRACE_FILE', None) if settings.configured else None
+    return path or os.environ.get('DJU_TRACE_FILE') or None
+
+
+def new_id(size):
+    return os.urandom(size).hex()
+
+
+def parse_traceparent(value):
+    """(trace id, parent span id) of a `traceparent` value, or None."""
+    match = _TRACEPARENT_PATTERN.match(value.strip().lower()) if value else None
+    if match is None or set(match[1]) == {'0'} or set(match[2]) == {'0'}:
+        return None
+    return match[1], match[2]
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_span_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = None
+        self.start_ns = None
+        self.end_ns = None
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        # A clean sys.exit() ends management commands; not an error
+        if exc is not None and not (isinstance(exc, SystemExit) and not exc.code):
+            self.set_error(f'{exc_type.__name__}: {exc}')
+        export(self)
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': otlp_attributes(self.attributes),
+            'status': {'code': self.status_code},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def otlp_value(value):
+    # bool first, it is an int too
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_attributes(attributes):
+    return [{'key': key, 'value': otlp_value(value)} for key, value in attributes.items()]
+
+
+def start_span(name, traceparent=None, kind=KIND_INTERNAL, attributes=None):
+    """
+    Context manager for a span. Its parent is `traceparent` if given and
+    valid, else the current span; without either it starts a new trace.
+    Yields None when tracing is off.
+    """
+    if get_trace_file() is None:
+        return contextlib.nullcontext()
+    parent = parse_traceparent(traceparent)
+    if parent is None and (current := _current_span.get()) is not None:
+        parent = current.trace_id, current.span_id
+    trace_id, parent_span_id = parent or (new_id(16), None)
+    return Span(name, trace_id, parent_span_id, kind, attributes)
+
+
+def current_traceparent():
+    """`traceparent` for propagating the current span, or None."""
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+
+def export(span):
+    path = get_trace_file()
+    if path is None:
+        return
+    line = json.dumps({
+        'resourceSpans': [{
+            'resource': {'attributes': otlp_attributes({
+                'service.name': os.environ.get('OTEL_SERVICE_NAME', 'djultra'),
+                'process.pid': os.getpid(),
+            })},
+            'scopeSpans': [{'scope': {'name': 'djultra'}, 'spans': [span.to_otlp()]}],
+        }],
+    }, separators=(',', ':'))
+    try:
+        # One short append per span, so processes sharing the file don't
+        # interleave within a line
+        with _write_lock, open(path, 'a') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        logger.warning(f'Writing span to {path} failed: {e}')
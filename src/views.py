@@ -1,5 +1,14 @@
+import hashlib
+from functools import partial
+
 from django.conf import settings
+from django.db.models import Count, Max, QuerySet
+from django.http import HttpResponseNotModified
 from django.shortcuts import render
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from djultra.models import Base
 
 
 def index(request):
@@ -12,3 +21,97 @@ def index(request):
         'recaptcha_site_key': settings.RECAPTCHA_SITE_KEY,
     }
     return render(request, 'index.html', context)
+
+
+def etag_matches(request, etag):
+    """Weak comparison of `etag` against the request's If-None-Match header."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return '*' in candidates or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in candidates}
+
+
+class ConditionalListMixin:
+    """
+    Conditional GET for DRF list views. For querysets of djultra `Base` models
+    the ETag is derived from max(updated_at) and the row count of the filtered
+    queryset, plus everything else that shapes the payload (query string,
+    serializer, renderer, user). A poll with a matching If-None-Match gets a
+    304 after that single aggregate query, before any serialization. Other
+    querysets fall back to hashing the rendered body, which saves the
+    transfer but not the serialization.
+
+    Views whose output depends on more than that add it via get_etag_extra().
+    """
+
+    def get_etag_extra(self):
+        return ''
+
+    def get_list_etag(self, request, queryset):
+        if not isinstance(queryset, QuerySet) or not issubclass(queryset.model, Base):
+            return None
+
+        stats = queryset.order_by().aggregate(last_updated=Max('updated_at'), count=Count('pk'))
+        serializer_class = self.get_serializer_class()
+        parts = (
+            queryset.model._meta.label,
+            stats['last_updated'].isoformat() if stats['last_updated'] else '',
+            stats['count'],
+            f'{serializer_class.__module__}.{serializer_class.__qualname__}',
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            getattr(request.user, 'pk', None),
+            self.get_etag_extra(),
+        )
+        digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+        return f'W/"{digest}"'
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request, self.filter_queryset(self.get_queryset()))
+        if etag is None:
+            response = super().list(request, *args, **kwargs)
+            response.add_post_render_callback(partial(self.set_body_etag, request))
+            return response
+
+        if etag_matches(request, etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def set_body_etag(self, request, response):
+        if response.status_code != 200:
+            return response
+        etag = f'"{hashlib.md5(response.content, usedforsecurity=False).hexdigest()}"'
+        if etag_matches(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        response['ETag'] = etag
+        return response
+
+
+class OptimizedQuerySetMixin:
+    """
+    For DRF list views: list() loads what the serializer reads, as planned by
+    its optimize_queryset_for() from the serializer context (see
+    DynamicFieldsModelSerializer), so a list costs a fixed number of queries
+    instead of one more per row. Other actions, get_object() included, get
+    the queryset unchanged, as do serializers without that hook.
+    """
+
+    _optimize_queryset = False
+
+    def list(self, request, *args, **kwargs):
+        self._optimize_queryset = True
+        try:
+            return super().list(request, *args, **kwargs)
+        finally:
+            self._optimize_queryset = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self._optimize_queryset:
+            return queryset
+        optimize = getattr(self.get_serializer_class(), 'optimize_queryset_for', None)
+        return optimize(queryset, self.get_serializer_context()) if optimize is not None else queryset
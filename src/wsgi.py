@@ -0,0 +1,165 @@
+# djultra/wsgi.py
+#
+# WSGI entry point for djultra projects. A project's wsgi.py becomes:
+#
+#     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+#
+#     from djultra import wsgi
+#     application = wsgi.get_wsgi_application()
+#
+import gc
+import itertools
+import logging
+import os
+from datetime import datetime
+
+import django.core.wsgi
+
+logger = logging.getLogger(__name__)
+
+
+# Request start headers of proxies, checked in order: X-Start-Time, then
+# X-Request-Start (nginx, HAProxy, Heroku)
+START_TIME_HEADERS = ('HTTP_X_START_TIME', 'HTTP_X_REQUEST_START')
+
+
+def parse_epoch(value):
+    """
+    Epoch seconds of a proxy's request start header: epoch seconds, milli-
+    or microseconds, optionally prefixed with "t="; None if it is not one.
+    """
+    if value is None:
+        return None
+    try:
+        start = float(str(value).strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return start
+
+
+def parse_start_time(value):
+    """parse_epoch() as a datetime; datetimes pass through."""
+    if isinstance(value, datetime):
+        return value
+    start = parse_epoch(value)
+    try:
+        return datetime.fromtimestamp(start) if start is not None else None
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+class RequestStampingApplication:
+    """
+    Stamps every request with HTTP_X_REQUEST_ID and HTTP_X_START_TIME before
+    it enters Django, as RequestIDMiddleware and LoadSheddingMiddleware
+    expect. The start time is the proxy's (X-Start-Time or X-Request-Start)
+    when it sent one, so the time spent waiting for a worker counts; only
+    without one it is the time the worker picked the request up. The id is
+    the process id plus a per-process counter (hex), which is unique across
+    prefork workers and costs next to nothing. It is not secret; don't use it
+    as a token or nonce.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.counter = itertools.count(1)
+
+    def __call__(self, environ, start_response):
+        global _serving
+        _serving = True
+        start_time = None
+        for key in START_TIME_HEADERS:
+            if key in environ and (start_time := parse_start_time(environ[key])) is not None:
+                break
+        environ['HTTP_X_START_TIME'] = start_time or datetime.now()
+        environ['HTTP_X_REQUEST_ID'] = f'{os.getpid():x}-{next(self.counter):x}'
+        return self.application(environ, start_response)
+
+
+def connect_databases():
+    from django.db import connections
+
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except Exception as e:
+            logger.warning(f'Warm-up could not connect to database "{alias}": {e}')
+
+
+def close_databases():
+    from django.db import connections
+
+    # An open transaction is left alone; closing would break it for the parent
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+_fork_hooks_registered = False
+
+# Set once the process handles requests. Only a server's master forks before
+# that (prefork workers); forks of a serving process, like the process pool
+# of clean_rows(), keep the parent's connections as they are.
+_serving = False
+
+
+def before_fork():
+    if not _serving:
+        close_databases()
+
+
+def after_fork_in_child():
+    if not _serving:
+        connect_databases()
+
+
+def warm_up(templates=('index.html',), databases=True):
+    """
+    Does the work the first request of a worker would otherwise pay for:
+    imports the URLconf with all views, compiles `templates` into the
+    template loader cache and opens the database connections.
+    """
+    global _fork_hooks_registered
+
+    from django.template import TemplateDoesNotExist, loader
+    from django.urls import get_resolver
+
+    # Imports all URLconf modules and builds the reverse lookup tables
+    get_resolver().reverse_dict
+
+    for template_name in templates:
+        try:
+            loader.get_template(template_name)
+        except TemplateDoesNotExist:
+            logger.debug(f'Warm-up template not found: {template_name}')
+
+    if databases:
+        connect_databases()
+        # Connections must not be shared with forked workers (gunicorn
+        # --preload and similar): until the process serves requests, close
+        # them in the parent right before a fork and open fresh ones in the
+        # child
+        if not _fork_hooks_registered:
+            os.register_at_fork(before=before_fork, after_in_child=after_fork_in_child)
+            _fork_hooks_registered = True
+
+
+def get_wsgi_application(warm_up_app=True, templates=('index.html',), databases=True, freeze=True):
+    """
+    Django's WSGI application wrapped in RequestStampingApplication. With
+    `warm_up_app`, the application is warmed up right after loading and, with
+    `freeze`, everything allocated so far is moved out of the garbage
+    collector's reach (gc.freeze()), so prefork workers keep sharing those
+    memory pages instead of copying them on the first collection.
+    """
+    application = django.core.wsgi.get_wsgi_application()
+    if warm_up_app:
+        warm_up(templates=templates, databases=databases)
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return RequestStampingApplication(application)